@@ -1,16 +1,38 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-from .jar import JarFile, JarError
+from .jar import JarFile, JarStream, JarError
 from .manifest import ManifestError
-from .core import ClassFile, ClassError, ConstantType
-from .descriptor import field_descriptor, method_descriptor
+from .core import ClassFile, ClassError, ConstantType, PoolStats
+from .descriptor import field_descriptor, method_descriptor, DescriptorCache
+from .scan import ClassSummary, scan_jars, collect_stats
+from .cache import ParseCache
+from .index import SymbolIndex, SymbolIndexError
+from .jardiff import DiffRecord, diff
+from .classpath import ClassPath, ClassPathError
+from .batch import ingest
+from . import instrument
 
 __all__ = [
     'JarFile',
+    'JarStream',
     'JarError',
     'ManifestError',
     'ClassFile',
     'ClassError',
     'field_descriptor',
-    'method_descriptor'
+    'method_descriptor',
+    'DescriptorCache',
+    'ClassSummary',
+    'scan_jars',
+    'collect_stats',
+    'PoolStats',
+    'ParseCache',
+    'SymbolIndex',
+    'SymbolIndexError',
+    'DiffRecord',
+    'diff',
+    'ClassPath',
+    'ClassPathError',
+    'ingest',
+    'instrument'
 ]
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['find_origins', 'ingest']
+
+import os
+import json
+import threading
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from .jar import JarFile
+from .core import ClassFile
+from .util.compat import xrange, replace_file
+
+# Files under a directory that are ingested as JARs of their own.
+JAR_SUFFIXES = ('.jar', '.zip')
+
+# What producers put on the output queue.
+_ENTRY = 0
+_DONE = 1
+_ERROR = 2
+_EXIT = 3
+_FAILED = 4
+
+
+class _Budget(object):
+    """
+    Counts the bytes of the classes in flight, blocking producers while
+    taking more would go over `limit`. A class bigger than the whole
+    budget is still let through once nothing else is in flight.
+    """
+    def __init__(self, limit):
+        self._limit = limit
+        self._used = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        """
+        Waits for room for `size` bytes and takes it. Returns `False`
+        without taking anything if the budget has been closed.
+        """
+        with self._cond:
+            while (self._used and self._used + size > self._limit and
+                    not self._closed):
+                self._cond.wait()
+            if self._closed:
+                return False
+            self._used += size
+            return True
+
+    def release(self, size):
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+    def close(self):
+        """Wakes every waiting producer, to give up."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def _is_jar(filename):
+    return filename.lower().endswith(JAR_SUFFIXES)
+
+
+def find_origins(paths):
+    """
+    Returns a list of (origin, is_jar) tuples for everything to ingest
+    from `paths`, which may be JARs or directories. Every JAR found under
+    a directory is an origin of its own, and so is the directory itself
+    if there are any classes under it.
+    """
+    origins = []
+    for path in paths:
+        if not os.path.isdir(path):
+            origins.append((path, True))
+            continue
+
+        has_classes = False
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if _is_jar(filename):
+                    origins.append((os.path.join(root, filename), True))
+                elif filename.endswith('.class'):
+                    has_classes = True
+        if has_classes:
+            origins.append((path, False))
+    return origins
+
+
+def _class_files(path):
+    """
+    Returns the sorted entry names, relative to the directory `path`, of
+    every class file under it.
+    """
+    names = []
+    for root, dirs, files in os.walk(path):
+        relative = os.path.relpath(root, path)
+        prefix = '' if relative == '.' else relative.replace(os.sep, '/')
+        for filename in files:
+            if filename.endswith('.class'):
+                names.append(prefix + '/' + filename if prefix else filename)
+    names.sort()
+    return names
+
+
+def _read_jar(path, skip, budget):
+    """
+    Yields a tuple of (entry_name, contents, size) for the classes of the
+    JAR `path` past the first `skip`, taking each from the `budget` before
+    inflating it.
+    """
+    jar = JarFile(path, lazy=True)
+    try:
+        names = sorted(n for n in jar.namelist() if n.endswith('.class'))
+        for name in names[skip:]:
+            size = jar._entries[name].file_size
+            if not budget.acquire(size):
+                return
+            yield name, jar.read(name), size
+    finally:
+        jar.close()
+
+
+def _read_directory(path, skip, budget):
+    """Like `_read_jar()`, for the classes under the directory `path`."""
+    for name in _class_files(path)[skip:]:
+        full_path = os.path.join(path, *name.split('/'))
+        size = os.path.getsize(full_path)
+        if not budget.acquire(size):
+            return
+        with open(full_path, 'rb') as fin:
+            yield name, fin.read(), size
+
+
+def _produce(origins, out, budget, stop, descriptor_cache):
+    """
+    Parses whole origins taken from the queue `origins` until it's empty
+    or `stop` is set, putting every class on `out` followed by a marker
+    for the end of the origin. A class that fails to parse is put on
+    `out` as a failure in its place, while an error reading the origin
+    itself ends the run.
+    """
+    origin = None
+    try:
+        while not stop.is_set():
+            try:
+                origin, is_jar, skip = origins.get_nowait()
+            except Empty:
+                break
+
+            read = _read_jar if is_jar else _read_directory
+            for name, contents, size in read(origin, skip, budget):
+                try:
+                    cf = ClassFile.from_buffer(contents,
+                        descriptor_cache=descriptor_cache)
+                except Exception as e:
+                    budget.release(size)
+                    out.put((_FAILED, origin, (name, e)))
+                    continue
+                out.put((_ENTRY, origin, (name, cf, size)))
+
+            if stop.is_set():
+                break
+            out.put((_DONE, origin, None))
+    except Exception as e:
+        out.put((_ERROR, origin, e))
+    finally:
+        out.put((_EXIT, None, None))
+
+
+def _stamp(origin, is_jar):
+    # Directories aren't checked for changes, as that would mean walking
+    # them again.
+    if not is_jar:
+        return None
+    st = os.stat(origin)
+    return [st.st_size, int(st.st_mtime)]
+
+
+def _load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as fin:
+        return json.load(fin)['origins']
+
+
+def _save_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fout:
+        json.dump({'origins': state}, fout)
+    replace_file(tmp, path)
+
+
+def ingest(paths, max_bytes=64 * 1024 * 1024, workers=4, checkpoint=None,
+        checkpoint_every=1024, descriptor_cache=None, on_error=None):
+    """
+    Yields a tuple of (origin, entry_name, ClassFile) for every class in
+    the JARs and directories at `paths` (see `find_origins()`), where
+    origin is the path of the JAR or directory the class came from.
+    Classes are read and parsed ahead by `workers` threads, each working
+    through one origin at a time, so classes of different origins are
+    interleaved but those of one origin come in order.
+
+    The classes read ahead and the one last yielded together stay under
+    `max_bytes` of class files: producers wait for the consumer once they
+    would go over. A ClassFile kept after asking for the next one no
+    longer counts, so hold on to as few as possible.
+
+    If `checkpoint` is the path of a JSON file, how far each origin has
+    been consumed is saved there every `checkpoint_every` classes and
+    when iteration ends or is abandoned. A later call with the same
+    checkpoint skips origins already finished and resumes the others at
+    the class that was being handled, unless a JAR has changed since.
+
+    A class that fails to parse is skipped, and the rest of the run goes
+    on. `on_error`, if given, is called with the origin, the entry name
+    and the exception for each one, and can raise to stop the run. The
+    class counts as consumed either way, so a resumed run won't trip
+    over it again. The names of such classes are also kept under
+    `failed` for each origin in the checkpoint. Only an error reading an
+    origin itself, such as a corrupt JAR, ends the run.
+    """
+    state = _load_checkpoint(checkpoint)
+
+    origins = Queue()
+    for origin, is_jar in find_origins(paths):
+        stamp = _stamp(origin, is_jar)
+        progress = state.get(origin)
+        if progress is None or progress['stamp'] != stamp:
+            progress = state[origin] = {
+                'stamp': stamp,
+                'consumed': 0,
+                'done': False,
+                'failed': []
+            }
+        if not progress['done']:
+            origins.put((origin, is_jar, progress['consumed']))
+
+    out = Queue()
+    budget = _Budget(max_bytes)
+    stop = threading.Event()
+    threads = []
+    for _ in xrange(max(1, workers)):
+        thread = threading.Thread(target=_produce,
+            args=(origins, out, budget, stop, descriptor_cache))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    running = len(threads)
+    unsaved = 0
+    try:
+        while running:
+            kind, origin, value = out.get()
+            if kind == _ENTRY or kind == _FAILED:
+                progress = state[origin]
+                if kind == _ENTRY:
+                    name, cf, size = value
+                    yield origin, name, cf
+                    budget.release(size)
+                    progress['consumed'] += 1
+                else:
+                    name, error = value
+                    progress['consumed'] += 1
+                    progress.setdefault('failed', []).append(name)
+                    if on_error is not None:
+                        on_error(origin, name, error)
+
+                unsaved += 1
+                if checkpoint is not None and unsaved >= checkpoint_every:
+                    _save_checkpoint(checkpoint, state)
+                    unsaved = 0
+            elif kind == _DONE:
+                state[origin]['done'] = True
+            elif kind == _ERROR:
+                raise value
+            else:
+                running -= 1
+    finally:
+        stop.set()
+        budget.close()
+        for thread in threads:
+            thread.join()
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, state)
@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Benchmarks for the hot paths of Solum, run with::
+
+    python -m solum.bench [--classes N] [--refs N] [--output FILE]
+
+Synthetic class files and JARs are generated in a temporary directory, so
+no network or real JARs are needed. Results are written as JSON, with the
+throughput and peak memory of every benchmark, so runs can be compared
+across versions.
+"""
+__all__ = ['make_class', 'make_jar', 'make_manifest', 'run', 'main']
+
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import zipfile
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from timeit import default_timer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .jar import JarFile
+from .manifest import ManifestFile
+from .core.constants import ConstantPool
+from .descriptor import split_descriptor
+from .util.compat import BytesIO, xrange, to_bytes
+
+_DESCRIPTORS = (
+    '()V',
+    '(Ljava/lang/String;)V',
+    '(I)I',
+    '()Ljava/lang/Object;',
+    '(Ljava/lang/Object;)Z',
+    '([BII)V',
+    '(JLjava/util/concurrent/TimeUnit;)Z',
+    '([[Ljava/lang/String;Ljava/util/Map;D)[Ljava/util/List;'
+)
+
+
+class _PoolBuilder(object):
+    """Builds a deduplicated constant pool, as a compiler would."""
+    def __init__(self):
+        self._entries = []
+        self._count = 1
+        self._seen = {}
+
+    def _add(self, key, data, slots=1):
+        index = self._seen.get(key)
+        if index is None:
+            index = self._seen[key] = self._count
+            self._entries.append(data)
+            self._count += slots
+        return index
+
+    def utf8(self, value):
+        data = to_bytes(value)
+        return self._add(('utf8', value),
+            struct.pack('>BH', 1, len(data)) + data)
+
+    def class_(self, name):
+        return self._add(('class', name),
+            struct.pack('>BH', 7, self.utf8(name)))
+
+    def string(self, value):
+        return self._add(('string', value),
+            struct.pack('>BH', 8, self.utf8(value)))
+
+    def integer(self, value):
+        return self._add(('int', value), struct.pack('>Bi', 3, value))
+
+    def long_(self, value):
+        return self._add(('long', value), struct.pack('>Bq', 5, value), 2)
+
+    def ref(self, tag, class_name, name, descriptor):
+        nat = self._add(('nat', name, descriptor), struct.pack('>BHH', 12,
+            self.utf8(name), self.utf8(descriptor)))
+        return self._add(('ref', tag, class_name, name, descriptor),
+            struct.pack('>BHH', tag, self.class_(class_name), nat))
+
+    def build(self):
+        return struct.pack('>H', self._count) + b''.join(self._entries)
+
+
+def make_class(name, refs=200, methods=8):
+    """
+    Returns the bytes of a valid class file called `name` (in internal
+    form) with roughly `refs` field and method references and `methods`
+    methods, each with a small Code attribute.
+    """
+    cp = _PoolBuilder()
+    this = cp.class_(name)
+    super_ = cp.class_('java/lang/Object')
+    code_name = cp.utf8('Code')
+
+    calls = []
+    for i in xrange(refs):
+        owner = 'com/example/dep%d/Type%d' % (i % 7, i % 41)
+        if i % 4 == 0:
+            calls.append((0xB2, cp.ref(9, owner, 'field%d' % i,
+                'Ljava/lang/String;')))
+        else:
+            calls.append((0xB6, cp.ref(10, owner, 'method%d' % i,
+                _DESCRIPTORS[i % len(_DESCRIPTORS)])))
+        if i % 10 == 0:
+            cp.string('string constant %d' % i)
+            cp.integer(i)
+            cp.long_(i << 33)
+
+    out = []
+    per_method = max(1, len(calls) // max(1, methods))
+    for m in xrange(methods):
+        body = b''.join(struct.pack('>BH', op, index)
+            for op, index in calls[m * per_method:(m + 1) * per_method])
+        body += b'\xb1'
+        code = struct.pack('>HHI', 8, 8, len(body)) + body
+        code += struct.pack('>HH', 0, 0)
+        out.append(struct.pack('>HHHH', 0x0001, cp.utf8('m%d' % m),
+            cp.utf8('()V'), 1))
+        out.append(struct.pack('>HI', code_name, len(code)) + code)
+
+    return b''.join([
+        struct.pack('>IHH', 0xCAFEBABE, 0, 0x32),
+        cp.build(),
+        struct.pack('>HHHHH', 0x0021, this, super_, 0, 0),
+        struct.pack('>H', methods),
+        b''.join(out),
+        struct.pack('>H', 0)
+    ])
+
+
+def make_manifest(sections):
+    """
+    Returns the text of a signed-JAR style manifest with a `Name:` section
+    and digest for each of `sections` entries.
+    """
+    lines = [
+        'Manifest-Version: 1.0',
+        'Created-By: solum.bench',
+        'Main-Class: com.example.Main',
+        ''
+    ]
+    for i in xrange(sections):
+        lines.append('Name: com/example/pkg%d/SomeRatherLongClassName%d'
+            'WithSuffix.class' % (i % 97, i))
+        lines.append('SHA-256-Digest: %044d' % i)
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def make_jar(path, classes=500, refs=200):
+    """Writes a JAR of `classes` synthetic classes to `path`."""
+    zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    zf.writestr('META-INF/MANIFEST.MF', make_manifest(classes))
+    for i in xrange(classes):
+        name = 'com/example/pkg%d/SomeRatherLongClassName%dWithSuffix' % (
+            i % 97, i)
+        zf.writestr('%s.class' % name, make_class(name, refs=refs))
+    zf.close()
+
+
+def _class_names(jar):
+    return sorted(n for n in jar.namelist() if n.endswith('.class'))
+
+
+def _setup_jar(ctx):
+    ctx['jar_size'] = os.path.getsize(ctx['jar'])
+
+
+def _setup_classes(ctx):
+    ctx['loaded'] = JarFile(ctx['jar'])
+    ctx['names'] = _class_names(ctx['loaded'])
+    zf = zipfile.ZipFile(ctx['jar'])
+    try:
+        ctx['class_bytes'] = sum(zf.getinfo(n).file_size
+            for n in ctx['names'])
+    finally:
+        zf.close()
+
+
+def _setup_class_data(ctx):
+    jar = JarFile(ctx['jar'])
+    ctx['class_data'] = [jar.read(n) for n in _class_names(jar)]
+    ctx['class_bytes'] = sum(len(d) for d in ctx['class_data'])
+
+
+def _setup_descriptors(ctx):
+    ctx['descriptors'] = list(_DESCRIPTORS) * (
+        ctx['classes'] * ctx['refs'] // len(_DESCRIPTORS) // 10 + 1)
+
+
+def _setup_manifest(ctx):
+    ctx['manifest'] = make_manifest(ctx['classes'])
+
+
+def _setup_parsed_manifest(ctx):
+    _setup_manifest(ctx)
+    ctx['parsed_manifest'] = ManifestFile(ctx['manifest'])
+
+
+def _setup_loaded(ctx):
+    ctx['loaded'] = JarFile(ctx['jar'])
+
+
+def _setup_modified(ctx):
+    ctx['modified'] = JarFile(ctx['jar'])
+    for name in _class_names(ctx['modified']):
+        ctx['modified'].write(name, ctx['modified'].read(name))
+
+
+def _bench_jar_open(ctx):
+    JarFile(ctx['jar'])
+    return ctx['classes'] + 1, ctx['jar_size']
+
+
+def _bench_jar_open_lazy(ctx):
+    JarFile(ctx['jar'], lazy=True).close()
+    return ctx['classes'] + 1, ctx['jar_size']
+
+
+def _bench_open_class(ctx):
+    jar = ctx['loaded']
+    for name in ctx['names']:
+        cf = jar.open_class(name)
+        for constant in cf.constants.find():
+            pass
+    return len(ctx['names']), ctx['class_bytes']
+
+
+def _bench_peek_class(ctx):
+    jar = ctx['loaded']
+    for name in ctx['names']:
+        jar.peek_class(name)
+    return len(ctx['names']), ctx['class_bytes']
+
+
+def _bench_constant_pool(ctx):
+    for data in ctx['class_data']:
+        source = BytesIO(data)
+        source.seek(8)
+        cp = ConstantPool()
+        cp.read_from_file(source)
+        for constant in cp.find():
+            pass
+    return len(ctx['class_data']), ctx['class_bytes']
+
+
+def _bench_split_descriptor(ctx):
+    size = 0
+    for descriptor in ctx['descriptors']:
+        split_descriptor(descriptor)
+        size += len(descriptor)
+    return len(ctx['descriptors']), size
+
+
+def _bench_manifest_parse(ctx):
+    ManifestFile(ctx['manifest'])
+    return ctx['classes'], len(ctx['manifest'])
+
+
+def _bench_manifest_build(ctx):
+    ctx['parsed_manifest'].build()
+    return ctx['classes'], len(ctx['manifest'])
+
+
+def _bench_jar_save(ctx):
+    ctx['loaded'].save(ctx['output'])
+    return ctx['classes'] + 1, os.path.getsize(ctx['output'])
+
+
+def _bench_jar_save_modified(ctx):
+    ctx['modified'].save(ctx['output'])
+    return ctx['classes'] + 1, os.path.getsize(ctx['output'])
+
+
+# Each benchmark is (name, setup, func). The setup builds only the
+# fixtures that benchmark uses, and is not timed.
+BENCHMARKS = [
+    ('jar_open', _setup_jar, _bench_jar_open),
+    ('jar_open_lazy', _setup_jar, _bench_jar_open_lazy),
+    ('open_class', _setup_classes, _bench_open_class),
+    ('peek_class', _setup_classes, _bench_peek_class),
+    ('constant_pool', _setup_class_data, _bench_constant_pool),
+    ('split_descriptor', _setup_descriptors, _bench_split_descriptor),
+    ('manifest_parse', _setup_manifest, _bench_manifest_parse),
+    ('manifest_build', _setup_parsed_manifest, _bench_manifest_build),
+    ('jar_save', _setup_loaded, _bench_jar_save),
+    ('jar_save_modified', _setup_modified, _bench_jar_save_modified)
+]
+
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and kilobytes everywhere else.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _peak_kb(func, ctx, baseline):
+    """
+    Returns the peak memory, in kilobytes, used by a call of `func`.
+
+    Where tracemalloc is available the call is run once more, untimed,
+    and its peak allocation is returned. Otherwise this falls back to how
+    far the call pushed the process's RSS high-water mark above
+    `baseline`, which reads as 0 when setup used more than the benchmark.
+    """
+    if tracemalloc is None:
+        peak = _max_rss_kb()
+        return None if peak is None else peak - baseline
+
+    tracemalloc.start()
+    try:
+        func(ctx)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _run_one(name, setup, func, workdir, classes, refs, repeat, queue):
+    try:
+        ctx = {
+            'jar': os.path.join(workdir, 'bench.jar'),
+            'output': os.path.join(workdir, 'out.jar'),
+            'classes': classes,
+            'refs': refs
+        }
+        setup(ctx)
+        baseline = _max_rss_kb()
+        best = None
+        for _ in xrange(repeat):
+            start = default_timer()
+            items, size = func(ctx)
+            elapsed = default_timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        peak = _peak_kb(func, ctx, baseline)
+
+        best = max(best, 1e-9)
+        queue.put({
+            'name': name,
+            'seconds': best,
+            'items': items,
+            'bytes': size,
+            'items_per_second': items / best,
+            'mb_per_second': size / best / (1024.0 * 1024.0),
+            'peak_kb': peak,
+            'memory': 'rss' if tracemalloc is None else 'tracemalloc'
+        })
+    except Exception as e:
+        queue.put({'name': name, 'error': repr(e)})
+
+
+def run(classes=500, refs=200, repeat=3, only=None):
+    """
+    Runs every benchmark (or just those named in `only`) and returns the
+    report as a dict. Each benchmark runs in its own process with only its
+    own fixtures loaded, and the best of `repeat` runs is kept.
+    """
+    workdir = tempfile.mkdtemp(prefix='solum-bench-')
+    try:
+        make_jar(os.path.join(workdir, 'bench.jar'), classes, refs)
+
+        results = []
+        for name, setup, func in BENCHMARKS:
+            if only and name not in only:
+                continue
+
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_run_one, args=(name,
+                setup, func, workdir, classes, refs, repeat, queue))
+            proc.start()
+            results.append(queue.get())
+            proc.join()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'params': {
+            'classes': classes,
+            'refs': refs,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m solum.bench',
+        description='Benchmarks Solum on synthetic classes and JARs.'
+    )
+    parser.add_argument('--classes', type=int, default=500,
+        help='number of classes in the generated JAR')
+    parser.add_argument('--refs', type=int, default=200,
+        help='field and method references per class')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='runs per benchmark, of which the fastest is kept')
+    parser.add_argument('--only', action='append',
+        choices=[b[0] for b in BENCHMARKS],
+        help='only run the given benchmark (may be repeated)')
+    parser.add_argument('--label', help='free-form label for this run')
+    parser.add_argument('--output', '-o',
+        help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(args.classes, args.refs, args.repeat, args.only)
+    report['label'] = args.label
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            fout.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+    return 1 if any('error' in r for r in report['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['ParseCache', 'cache_key', 'content_key']
+
+import zlib
+import sqlite3
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+def cache_key(crc, size):
+    """
+    Returns the cache key for a class whose contents have the CRC32 `crc`
+    and are `size` bytes long. Both are in the zip central directory, so a
+    JAR entry can be looked up without being inflated.
+    """
+    return '%08x-%d' % (crc & 0xffffffff, size)
+
+
+def content_key(contents):
+    """Returns the cache key for the class `contents`."""
+    return cache_key(zlib.crc32(contents), len(contents))
+
+
+class ParseCache(object):
+    """
+    A persistent cache of ClassSummary objects in an SQLite database,
+    keyed by the CRC32 and size of the class they were parsed from. Once
+    the stored summaries grow past `max_bytes`, the least recently used
+    are evicted.
+    """
+    # Writes are committed in batches of this many.
+    COMMIT_EVERY = 256
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS summaries ('
+            'key TEXT PRIMARY KEY, '
+            'value BLOB NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'used INTEGER NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS summaries_used ON summaries (used)'
+        )
+        self._db.commit()
+
+        size, used = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) '
+            'FROM summaries'
+        ).fetchone()
+        self._size = size
+        self._clock = used
+        self._pending = 0
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.flush()
+
+    def get(self, key):
+        """
+        Returns the summary stored under `key` (see `cache_key()`), or
+        `None`. Its `source` and `filename` are `None`, as a summary may be
+        shared by identical classes in many places.
+        """
+        row = self._db.execute(
+            'SELECT value FROM summaries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._db.execute(
+            'UPDATE summaries SET used = ? WHERE key = ?',
+            (self._tick(), key)
+        )
+        self._wrote()
+        return pickle.loads(zlib.decompress(bytes(row[0])))
+
+    def put(self, key, summary):
+        """Stores the ClassSummary `summary` under `key`."""
+        summary = summary._replace(source=None, filename=None)
+        value = zlib.compress(pickle.dumps(summary, 2))
+
+        row = self._db.execute(
+            'SELECT size FROM summaries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None:
+            self._size -= row[0]
+
+        self._db.execute(
+            'INSERT OR REPLACE INTO summaries (key, value, size, used) '
+            'VALUES (?, ?, ?, ?)',
+            (key, sqlite3.Binary(value), len(value), self._tick())
+        )
+        self._size += len(value)
+        self._wrote()
+
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drops the least recently used summaries until we're under 90%."""
+        target = self.max_bytes * 9 // 10
+        rows = self._db.execute(
+            'SELECT key, size FROM summaries ORDER BY used'
+        )
+        doomed = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            doomed.append((key,))
+            self._size -= size
+
+        self._db.executemany('DELETE FROM summaries WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+        self.flush()
+
+    def flush(self):
+        """Commits any pending writes to disk."""
+        self._db.commit()
+        self._pending = 0
+
+    def clear(self):
+        """Removes every summary and resets the statistics."""
+        self._db.execute('DELETE FROM summaries')
+        self.flush()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def close(self):
+        """Commits pending writes and closes the database."""
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        """
+        Returns a dict with the number of `hits`, `misses` and `evictions`
+        so far, and the number of `entries` and their total `size` in
+        bytes against `max_size`.
+        """
+        entries, = self._db.execute(
+            'SELECT COUNT(*) FROM summaries'
+        ).fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size': self._size,
+            'max_size': self.max_bytes
+        }
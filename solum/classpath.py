@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['ClassPath', 'ClassPathError']
+
+import os
+import threading
+from collections import OrderedDict
+
+from .jar import JarFile
+from .core import ClassFile
+from .util.compat import iteritems
+
+
+class ClassPathError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+
+
+def _class_name(name):
+    """
+    Returns the dotted form of `name`, which may also be an internal name
+    or a class filename.
+    """
+    if name.endswith('.class'):
+        name = name[:-6]
+    return name.replace('/', '.')
+
+
+class ClassPath(object):
+    """
+    Resolves classes by name across a list of JARs and directories, in
+    order, so the first one to contain a class wins as it does for the
+    JVM. Which entry holds each class is indexed once up front, from the
+    central directory of every JAR and a walk of every directory.
+
+    Parsed classes are kept in a bounded LRU cache, weighed by the size
+    of the class file each was parsed from, which is what a ClassFile
+    holds on to. Once that passes `max_bytes` the least recently used are
+    evicted. A ClassPath may be shared between threads, and so may the
+    classes it loads, which are fully built before they are cached.
+    """
+    def __init__(self, entries, max_bytes=64 * 1024 * 1024,
+            descriptor_cache=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._descriptor_cache = descriptor_cache
+        # Each source is a tuple of (path, JarFile or None for a
+        # directory, lock serializing reads from the JarFile).
+        self._sources = []
+        # Dotted class name to (source, filename, size).
+        self._index = {}
+        self._cache = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        for path in entries:
+            if os.path.isdir(path):
+                self._add_directory(path)
+            elif os.path.isfile(path):
+                self._add_jar(path)
+            else:
+                raise ClassPathError('%s does not exist' % path)
+
+    def _add_jar(self, path):
+        jar = JarFile(path, lazy=True,
+            descriptor_cache=self._descriptor_cache)
+        source = (path, jar, threading.Lock())
+        self._sources.append(source)
+
+        index = self._index
+        for filename, zi in iteritems(jar._entries):
+            if (not filename.endswith('.class') or
+                    filename.startswith('META-INF/')):
+                continue
+            name = _class_name(filename)
+            if name not in index:
+                index[name] = (source, filename, zi.file_size)
+
+    def _add_directory(self, path):
+        source = (path, None, None)
+        self._sources.append(source)
+
+        index = self._index
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if not filename.endswith('.class'):
+                    continue
+                full_path = os.path.join(root, filename)
+                relative = os.path.relpath(full_path, path)
+                name = _class_name(relative.replace(os.sep, '/'))
+                if name not in index:
+                    index[name] = (source, full_path,
+                        os.path.getsize(full_path))
+
+    def __contains__(self, name):
+        return _class_name(name) in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def find(self, name):
+        """
+        Returns a tuple of (path, filename) giving the JAR or directory
+        the class `name` would be loaded from and the file within it, or
+        `None` if it isn't on the classpath.
+        """
+        location = self._index.get(_class_name(name))
+        if location is None:
+            return None
+        source, filename, _ = location
+        return source[0], filename
+
+    def _read(self, source, filename):
+        path, jar, lock = source
+        if jar is None:
+            sin = open(filename, 'rb')
+            try:
+                return sin.read()
+            finally:
+                sin.close()
+
+        with lock:
+            if jar._source is None:
+                raise ClassPathError('classpath has been closed')
+            return jar.read(filename)
+
+    def load(self, name):
+        """
+        Returns the ClassFile for the class `name`, which may be dotted
+        (java.util.HashMap) or internal (java/util/HashMap), parsing it
+        only if it isn't already cached. Raises ClassPathError if it isn't
+        on the classpath.
+
+        The ClassFile returned is shared with every other caller, so
+        treat it as read-only. Its constants and members are built before
+        it is returned, so any number of threads can read it at once.
+        """
+        name = _class_name(name)
+        with self._lock:
+            cache = self._cache
+            try:
+                cf = cache.pop(name)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                cache[name] = cf
+                return cf
+
+        location = self._index.get(name)
+        if location is None:
+            raise ClassPathError('class not found: %s' % name)
+
+        # Read and parse outside the lock. Two threads missing the same
+        # class at once both parse it, and the last one is kept.
+        source, filename, size = location
+        cf = ClassFile.from_buffer(self._read(source, filename),
+            descriptor_cache=self._descriptor_cache)
+        # Build everything a ClassFile would otherwise build the first
+        # time it is asked for, so reading it never modifies it and it
+        # can be shared without locking.
+        if not cf._cp._resolved:
+            cf._cp._resolve()
+        cf._load_body()
+
+        with self._lock:
+            cache = self._cache
+            if name in cache:
+                del cache[name]
+                self._size -= size
+            cache[name] = cf
+            self._size += size
+            while self._size > self.max_bytes and len(cache) > 1:
+                evicted, _ = cache.popitem(last=False)
+                self._size -= self._index[evicted][2]
+                self.evictions += 1
+        return cf
+
+    def clear(self):
+        """Empties the cache and resets its statistics."""
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dict with the number of `hits`, `misses` and `evictions`
+        so far, the number of `classes` cached and their total `bytes`,
+        and `max_bytes`.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'classes': len(self._cache),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
+
+    def close(self):
+        """
+        Closes every JAR on the classpath. Classes already cached can
+        still be loaded.
+        """
+        for path, jar, lock in self._sources:
+            if jar is not None:
+                with lock:
+                    jar.close()
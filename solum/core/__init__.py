@@ -1,6 +1,27 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-from .classfile import ClassFile, ClassError
+from .classfile import ClassFile, ClassError, ClassHeader
 from .constants import ConstantType
+from .compact import CompactPool, StringTable
+from .members import Attribute, Field, Method, Code
+from .writer import PoolWriter
+from .bytecode import BytecodeError, Instruction, disassemble
+from .stats import PoolStats
 
-__all__ = ['ClassFile', 'ClassError', 'ConstantType']
+__all__ = [
+    'ClassFile',
+    'ClassError',
+    'ClassHeader',
+    'ConstantType',
+    'CompactPool',
+    'StringTable',
+    'Attribute',
+    'Field',
+    'Method',
+    'Code',
+    'PoolWriter',
+    'BytecodeError',
+    'Instruction',
+    'disassemble',
+    'PoolStats'
+]
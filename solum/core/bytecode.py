@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = [
+    'BytecodeError',
+    'Instruction',
+    'MNEMONICS',
+    'disassemble',
+    'constant_indexes'
+]
+
+import struct
+from collections import namedtuple
+
+# Every opcode with its mnemonic and the struct format of its operands,
+# which follow it directly, or None for the variable length instructions.
+# Constant pool operands are listed in _POOL_REFS.
+_OPCODES = [
+    (0x00, 'nop', ''),
+    (0x01, 'aconst_null', ''),
+    (0x02, 'iconst_m1', ''),
+    (0x03, 'iconst_0', ''),
+    (0x04, 'iconst_1', ''),
+    (0x05, 'iconst_2', ''),
+    (0x06, 'iconst_3', ''),
+    (0x07, 'iconst_4', ''),
+    (0x08, 'iconst_5', ''),
+    (0x09, 'lconst_0', ''),
+    (0x0A, 'lconst_1', ''),
+    (0x0B, 'fconst_0', ''),
+    (0x0C, 'fconst_1', ''),
+    (0x0D, 'fconst_2', ''),
+    (0x0E, 'dconst_0', ''),
+    (0x0F, 'dconst_1', ''),
+    (0x10, 'bipush', 'b'),
+    (0x11, 'sipush', 'h'),
+    (0x12, 'ldc', 'B'),
+    (0x13, 'ldc_w', 'H'),
+    (0x14, 'ldc2_w', 'H'),
+    (0x15, 'iload', 'B'),
+    (0x16, 'lload', 'B'),
+    (0x17, 'fload', 'B'),
+    (0x18, 'dload', 'B'),
+    (0x19, 'aload', 'B'),
+    (0x1A, 'iload_0', ''),
+    (0x1B, 'iload_1', ''),
+    (0x1C, 'iload_2', ''),
+    (0x1D, 'iload_3', ''),
+    (0x1E, 'lload_0', ''),
+    (0x1F, 'lload_1', ''),
+    (0x20, 'lload_2', ''),
+    (0x21, 'lload_3', ''),
+    (0x22, 'fload_0', ''),
+    (0x23, 'fload_1', ''),
+    (0x24, 'fload_2', ''),
+    (0x25, 'fload_3', ''),
+    (0x26, 'dload_0', ''),
+    (0x27, 'dload_1', ''),
+    (0x28, 'dload_2', ''),
+    (0x29, 'dload_3', ''),
+    (0x2A, 'aload_0', ''),
+    (0x2B, 'aload_1', ''),
+    (0x2C, 'aload_2', ''),
+    (0x2D, 'aload_3', ''),
+    (0x2E, 'iaload', ''),
+    (0x2F, 'laload', ''),
+    (0x30, 'faload', ''),
+    (0x31, 'daload', ''),
+    (0x32, 'aaload', ''),
+    (0x33, 'baload', ''),
+    (0x34, 'caload', ''),
+    (0x35, 'saload', ''),
+    (0x36, 'istore', 'B'),
+    (0x37, 'lstore', 'B'),
+    (0x38, 'fstore', 'B'),
+    (0x39, 'dstore', 'B'),
+    (0x3A, 'astore', 'B'),
+    (0x3B, 'istore_0', ''),
+    (0x3C, 'istore_1', ''),
+    (0x3D, 'istore_2', ''),
+    (0x3E, 'istore_3', ''),
+    (0x3F, 'lstore_0', ''),
+    (0x40, 'lstore_1', ''),
+    (0x41, 'lstore_2', ''),
+    (0x42, 'lstore_3', ''),
+    (0x43, 'fstore_0', ''),
+    (0x44, 'fstore_1', ''),
+    (0x45, 'fstore_2', ''),
+    (0x46, 'fstore_3', ''),
+    (0x47, 'dstore_0', ''),
+    (0x48, 'dstore_1', ''),
+    (0x49, 'dstore_2', ''),
+    (0x4A, 'dstore_3', ''),
+    (0x4B, 'astore_0', ''),
+    (0x4C, 'astore_1', ''),
+    (0x4D, 'astore_2', ''),
+    (0x4E, 'astore_3', ''),
+    (0x4F, 'iastore', ''),
+    (0x50, 'lastore', ''),
+    (0x51, 'fastore', ''),
+    (0x52, 'dastore', ''),
+    (0x53, 'aastore', ''),
+    (0x54, 'bastore', ''),
+    (0x55, 'castore', ''),
+    (0x56, 'sastore', ''),
+    (0x57, 'pop', ''),
+    (0x58, 'pop2', ''),
+    (0x59, 'dup', ''),
+    (0x5A, 'dup_x1', ''),
+    (0x5B, 'dup_x2', ''),
+    (0x5C, 'dup2', ''),
+    (0x5D, 'dup2_x1', ''),
+    (0x5E, 'dup2_x2', ''),
+    (0x5F, 'swap', ''),
+    (0x60, 'iadd', ''),
+    (0x61, 'ladd', ''),
+    (0x62, 'fadd', ''),
+    (0x63, 'dadd', ''),
+    (0x64, 'isub', ''),
+    (0x65, 'lsub', ''),
+    (0x66, 'fsub', ''),
+    (0x67, 'dsub', ''),
+    (0x68, 'imul', ''),
+    (0x69, 'lmul', ''),
+    (0x6A, 'fmul', ''),
+    (0x6B, 'dmul', ''),
+    (0x6C, 'idiv', ''),
+    (0x6D, 'ldiv', ''),
+    (0x6E, 'fdiv', ''),
+    (0x6F, 'ddiv', ''),
+    (0x70, 'irem', ''),
+    (0x71, 'lrem', ''),
+    (0x72, 'frem', ''),
+    (0x73, 'drem', ''),
+    (0x74, 'ineg', ''),
+    (0x75, 'lneg', ''),
+    (0x76, 'fneg', ''),
+    (0x77, 'dneg', ''),
+    (0x78, 'ishl', ''),
+    (0x79, 'lshl', ''),
+    (0x7A, 'ishr', ''),
+    (0x7B, 'lshr', ''),
+    (0x7C, 'iushr', ''),
+    (0x7D, 'lushr', ''),
+    (0x7E, 'iand', ''),
+    (0x7F, 'land', ''),
+    (0x80, 'ior', ''),
+    (0x81, 'lor', ''),
+    (0x82, 'ixor', ''),
+    (0x83, 'lxor', ''),
+    (0x84, 'iinc', 'Bb'),
+    (0x85, 'i2l', ''),
+    (0x86, 'i2f', ''),
+    (0x87, 'i2d', ''),
+    (0x88, 'l2i', ''),
+    (0x89, 'l2f', ''),
+    (0x8A, 'l2d', ''),
+    (0x8B, 'f2i', ''),
+    (0x8C, 'f2l', ''),
+    (0x8D, 'f2d', ''),
+    (0x8E, 'd2i', ''),
+    (0x8F, 'd2l', ''),
+    (0x90, 'd2f', ''),
+    (0x91, 'i2b', ''),
+    (0x92, 'i2c', ''),
+    (0x93, 'i2s', ''),
+    (0x94, 'lcmp', ''),
+    (0x95, 'fcmpl', ''),
+    (0x96, 'fcmpg', ''),
+    (0x97, 'dcmpl', ''),
+    (0x98, 'dcmpg', ''),
+    (0x99, 'ifeq', 'h'),
+    (0x9A, 'ifne', 'h'),
+    (0x9B, 'iflt', 'h'),
+    (0x9C, 'ifge', 'h'),
+    (0x9D, 'ifgt', 'h'),
+    (0x9E, 'ifle', 'h'),
+    (0x9F, 'if_icmpeq', 'h'),
+    (0xA0, 'if_icmpne', 'h'),
+    (0xA1, 'if_icmplt', 'h'),
+    (0xA2, 'if_icmpge', 'h'),
+    (0xA3, 'if_icmpgt', 'h'),
+    (0xA4, 'if_icmple', 'h'),
+    (0xA5, 'if_acmpeq', 'h'),
+    (0xA6, 'if_acmpne', 'h'),
+    (0xA7, 'goto', 'h'),
+    (0xA8, 'jsr', 'h'),
+    (0xA9, 'ret', 'B'),
+    (0xAA, 'tableswitch', None),
+    (0xAB, 'lookupswitch', None),
+    (0xAC, 'ireturn', ''),
+    (0xAD, 'lreturn', ''),
+    (0xAE, 'freturn', ''),
+    (0xAF, 'dreturn', ''),
+    (0xB0, 'areturn', ''),
+    (0xB1, 'return', ''),
+    (0xB2, 'getstatic', 'H'),
+    (0xB3, 'putstatic', 'H'),
+    (0xB4, 'getfield', 'H'),
+    (0xB5, 'putfield', 'H'),
+    (0xB6, 'invokevirtual', 'H'),
+    (0xB7, 'invokespecial', 'H'),
+    (0xB8, 'invokestatic', 'H'),
+    (0xB9, 'invokeinterface', 'HBx'),
+    (0xBA, 'invokedynamic', 'Hxx'),
+    (0xBB, 'new', 'H'),
+    (0xBC, 'newarray', 'B'),
+    (0xBD, 'anewarray', 'H'),
+    (0xBE, 'arraylength', ''),
+    (0xBF, 'athrow', ''),
+    (0xC0, 'checkcast', 'H'),
+    (0xC1, 'instanceof', 'H'),
+    (0xC2, 'monitorenter', ''),
+    (0xC3, 'monitorexit', ''),
+    (0xC4, 'wide', None),
+    (0xC5, 'multianewarray', 'HB'),
+    (0xC6, 'ifnull', 'h'),
+    (0xC7, 'ifnonnull', 'h'),
+    (0xC8, 'goto_w', 'i'),
+    (0xC9, 'jsr_w', 'i'),
+    (0xCA, 'breakpoint', ''),
+    (0xFE, 'impdep1', ''),
+    (0xFF, 'impdep2', '')
+]
+
+_TABLESWITCH = 0xAA
+_LOOKUPSWITCH = 0xAB
+_IINC = 0x84
+_LDC = 0x12
+
+# Opcodes whose first operand is an index into the constant pool.
+_POOL_REFS = frozenset((
+    0x12, 0x13, 0x14, 0xB2, 0xB3, 0xB4, 0xB5, 0xB6, 0xB7, 0xB8, 0xB9,
+    0xBA, 0xBB, 0xBD, 0xC0, 0xC1, 0xC5
+))
+
+# Tables indexed by opcode: the mnemonic, the total length of the
+# instruction (0 if it varies, -1 if the opcode is invalid), a Struct for
+# its operands (an empty one if it has none), and how wide a constant pool
+# index it takes.
+MNEMONICS = [None] * 256
+_LENGTHS = [-1] * 256
+_OPERANDS = [None] * 256
+_POOL_WIDTHS = [0] * 256
+for _op, _name, _format in _OPCODES:
+    MNEMONICS[_op] = _name
+    if _format is None:
+        _LENGTHS[_op] = 0
+        continue
+    _struct = struct.Struct('>' + _format)
+    _LENGTHS[_op] = 1 + _struct.size
+    _OPERANDS[_op] = _struct
+    if _op in _POOL_REFS:
+        _POOL_WIDTHS[_op] = 1 if _op == _LDC else 2
+MNEMONICS = tuple(MNEMONICS)
+_LENGTHS = tuple(_LENGTHS)
+_OPERANDS = tuple(_OPERANDS)
+_POOL_WIDTHS = tuple(_POOL_WIDTHS)
+del _op, _name, _format, _struct
+
+_I4x2 = struct.Struct('>ii')
+_I4x3 = struct.Struct('>iii')
+_WIDE_IINC = struct.Struct('>BHh')
+_WIDE_LOCAL = struct.Struct('>BH')
+
+
+class BytecodeError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+
+
+class Instruction(namedtuple('Instruction', 'pc opcode operands')):
+    """
+    A single instruction at offset `pc` of a method body. `operands` is a
+    tuple of its raw operands, with branch offsets relative to `pc` as
+    they are stored. `tableswitch` has (default, low, high, offsets) and
+    `lookupswitch` (default, ((match, offset), ...)), and `wide` the
+    opcode it widens followed by that opcode's operands.
+    """
+    __slots__ = ()
+
+    @property
+    def mnemonic(self):
+        return MNEMONICS[self.opcode]
+
+    @property
+    def constant_index(self):
+        """
+        Returns the constant pool index the instruction refers to, or
+        `None` if it doesn't refer to one.
+        """
+        if _POOL_WIDTHS[self.opcode]:
+            return self.operands[0]
+        return None
+
+    def resolve(self, cp):
+        """
+        Returns the operands with any constant pool index replaced by the
+        constant it refers to in the ConstantPool `cp`.
+        """
+        if not _POOL_WIDTHS[self.opcode]:
+            return self.operands
+        return (cp.get(self.operands[0]),) + self.operands[1:]
+
+
+def _padding(pc):
+    # Switch operands are aligned to a multiple of four bytes from the
+    # start of the method body.
+    return 3 - pc % 4
+
+
+def _variable(code, pc, opcode):
+    """
+    Returns a tuple of (operands, length) for a tableswitch, lookupswitch
+    or wide instruction at `pc`.
+    """
+    if opcode == _TABLESWITCH:
+        start = pc + 1 + _padding(pc)
+        default, low, high = _I4x3.unpack_from(code, start)
+        count = high - low + 1
+        if count < 0:
+            raise BytecodeError('tableswitch at %d has low > high' % pc)
+        offsets = struct.unpack_from('>%di' % count, code, start + 12)
+        return (default, low, high, offsets), start + 12 + 4 * count - pc
+    elif opcode == _LOOKUPSWITCH:
+        start = pc + 1 + _padding(pc)
+        default, count = _I4x2.unpack_from(code, start)
+        if count < 0:
+            raise BytecodeError('lookupswitch at %d has %d pairs' % (pc,
+                count))
+        flat = struct.unpack_from('>%di' % (count * 2), code, start + 8)
+        pairs = tuple(zip(flat[::2], flat[1::2]))
+        return (default, pairs), start + 8 + 8 * count - pc
+
+    # wide
+    if code[pc + 1] == _IINC:
+        return _WIDE_IINC.unpack_from(code, pc + 1), 6
+    return _WIDE_LOCAL.unpack_from(code, pc + 1), 4
+
+
+def disassemble(code):
+    """
+    Yields an Instruction for every instruction in the method body `code`
+    (the `code` of a Code attribute), in order. Operands are left as they
+    are stored; see `Instruction.resolve()` to look up constants.
+    """
+    buf = bytearray(code)
+    end = len(buf)
+    lengths = _LENGTHS
+    operands = _OPERANDS
+    # Skips Instruction.__new__, which only repacks its arguments.
+    new = tuple.__new__
+    pc = 0
+
+    try:
+        while pc < end:
+            opcode = buf[pc]
+            length = lengths[opcode]
+            if length > 0:
+                yield new(Instruction, (pc, opcode,
+                    operands[opcode].unpack_from(buf, pc + 1)))
+                pc += length
+            elif length == 0:
+                args, length = _variable(buf, pc, opcode)
+                yield new(Instruction, (pc, opcode, args))
+                pc += length
+            else:
+                raise BytecodeError('invalid opcode 0x%02x at %d' % (opcode,
+                    pc))
+    except (struct.error, IndexError):
+        raise BytecodeError('truncated instruction at %d' % pc)
+
+    if pc != end:
+        raise BytecodeError('truncated instruction at %d' % pc)
+
+
+def constant_indexes(code):
+    """
+    Yields the constant pool index referred to by every instruction in
+    `code` that refers to one, in order, without building instructions.
+    This is all a call graph needs, see `ConstantPool.get()`.
+    """
+    buf = bytearray(code)
+    end = len(buf)
+    lengths = _LENGTHS
+    widths = _POOL_WIDTHS
+    pc = 0
+
+    try:
+        while pc < end:
+            opcode = buf[pc]
+            width = widths[opcode]
+            if width == 2:
+                yield buf[pc + 1] << 8 | buf[pc + 2]
+            elif width:
+                yield buf[pc + 1]
+
+            length = lengths[opcode]
+            if length > 0:
+                pc += length
+            elif length == 0:
+                pc += _variable(buf, pc, opcode)[1]
+            else:
+                raise BytecodeError('invalid opcode 0x%02x at %d' % (opcode,
+                    pc))
+    except (struct.error, IndexError):
+        raise BytecodeError('truncated instruction at %d' % pc)
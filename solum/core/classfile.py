@@ -1,10 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-__all__ = ['ClassFile', 'ClassError']
+__all__ = ['ClassFile', 'ClassError', 'ClassHeader']
 
+import mmap
 import struct
+from timeit import default_timer
+from collections import namedtuple
 
-from .constants import ConstantPool
+from .constants import ConstantPool, ConstantError, pool_offsets
+from .compact import CompactPool
+from .members import (
+    Field,
+    Method,
+    read_attributes,
+    read_members,
+    write_attributes,
+    write_members
+)
+from .writer import PoolWriter
+from .. import instrument
+from ..util import map_file, slice_bytes
+from ..util.compat import PY3, basestring, decode_utf8
+
+_HEADER = struct.Struct('>IHH')
+_U2 = struct.Struct('>H')
+_CLASS_INFO = struct.Struct('>HHHH')
+
+ClassHeader = namedtuple('ClassHeader', 'version name')
+# Sources which are parsed in place rather than read as a stream. On
+# Python 3 a str is a path and bytes are contents.
+_BUFFER_TYPES = (bytearray, memoryview, mmap.mmap)
+if PY3:
+    _BUFFER_TYPES += (bytes,)
 
 
 class ClassError(Exception):
@@ -13,32 +40,148 @@ class ClassError(Exception):
 
 
 class ClassFile(object):
-    def __init__(self, source=None):
+    def __init__(self, source=None, descriptor_cache=None):
+        """
+        Creates a new ClassFile, optionally loading it from `source`, which
+        may be a path, a file-like object or a buffer (bytearray,
+        memoryview or mmap, or bytes on Python 3). Use `from_buffer()` to
+        parse a Python 2 str.
+        `descriptor_cache` is passed on to the ConstantPool.
+        """
         self._this = None
+        self._super = None
+        self._interfaces = ()
+        self._access_flags = 0
         self._version = (0x31, 0)
+        self._descriptor_cache = descriptor_cache
+        self._cp = ConstantPool(descriptor_cache=descriptor_cache)
+
+        # The fields, methods and attributes are only read from `_body`, a
+        # tuple of (buffer, offset), when first asked for.
+        self._body = None
+        self._fields = []
+        self._methods = []
+        self._attributes = []
+
+        # The buffer and offset the body was loaded from, and the members
+        # as first read, so `to_bytes()` can copy an unchanged body.
+        self._source_body = None
+        self._loaded = None
 
         if source and isinstance(source, basestring):
             self._load_from_path(source)
+        elif source and isinstance(source, _BUFFER_TYPES):
+            self._load_from_buffer(source)
         elif source:
             self._load_from_file(source)
 
-    def _load_from_file(self, source):
-        def read(fmt):
-            return struct.unpack(fmt, source.read(struct.calcsize(fmt)))
+    @classmethod
+    def from_buffer(cls, buf, offset=0, descriptor_cache=None):
+        """
+        Parses a ClassFile out of `buf`, which may be a str or any other
+        object supporting the buffer protocol, starting at `offset`.
 
-        magic_number, = read(">I")
+        A str is parsed in place and kept, not copied. Any other buffer
+        may change or be closed once this returns, so the bytes of the
+        class are copied out of it while parsing, and `buf` is not used
+        afterwards.
+        """
+        cf = cls(descriptor_cache=descriptor_cache)
+        cf._load_from_buffer(buf, offset)
+        return cf
+
+    def _load_from_buffer(self, buf, offset=0):
+        rec = instrument.active()
+        if rec is not None:
+            started = default_timer()
+            size = len(buf) - offset
+
+        if len(buf) - offset < _HEADER.size:
+            raise ClassError('not a valid classfile')
+
+        magic_number, ver_min, ver_maj = _HEADER.unpack_from(buf, offset)
         if magic_number != 0xCAFEBABE:
             raise ClassError('not a valid classfile')
 
-        ver_min, ver_maj = read(">HH")
         self._version = (ver_maj, ver_min)
 
-        self._cp = ConstantPool(source)
+        self._cp = ConstantPool(descriptor_cache=self._descriptor_cache)
+        offset = self._cp.read_from_buffer(buf, offset + _HEADER.size)
+
+        if not isinstance(buf, bytes):
+            # Attribute bodies are read lazily, so hold on to our own copy
+            # of the rest of a buffer that may change or be closed.
+            buf = slice_bytes(buf, offset, len(buf))
+            offset = 0
+
+        (self._access_flags, self._this, self._super,
+            count) = _CLASS_INFO.unpack_from(buf, offset)
+        offset += _CLASS_INFO.size
+        self._interfaces = struct.unpack_from('>%dH' % count, buf, offset)
+        offset += count * 2
+
+        self._body = (buf, offset)
+        self._source_body = (buf, offset)
+        self._loaded = None
+
+        if rec is not None:
+            rec.add_time('class.load', default_timer() - started)
+            rec.count('class.bytes', size)
+
+    def _load_from_file(self, source):
+        self._load_from_buffer(source.read())
 
     def _load_from_path(self, path):
         sin = open(path, 'rb')
-        self._load_from_file(sin)
-        sin.close()
+        try:
+            buf = map_file(sin)
+            try:
+                self._load_from_buffer(buf)
+            finally:
+                if isinstance(buf, mmap.mmap):
+                    buf.close()
+        finally:
+            sin.close()
+
+    @staticmethod
+    def peek(source, name=True):
+        """
+        Reads only as much of `source` (anything accepted by ClassFile())
+        as is needed to return a ClassHeader with its version and, if
+        `name` is `True`, the name of the class. The constant pool is
+        skipped over without building any constants.
+        """
+        if isinstance(source, basestring):
+            sin = open(source, 'rb')
+            try:
+                buf = map_file(sin)
+                try:
+                    header = _peek_buffer(buf, name)
+                finally:
+                    if isinstance(buf, mmap.mmap):
+                        buf.close()
+            finally:
+                sin.close()
+        elif isinstance(source, _BUFFER_TYPES):
+            header = _peek_buffer(source, name)
+        else:
+            # Read as little as possible of the stream, growing from a
+            # few KB until the constant pool has been skipped.
+            buf = source.read(_HEADER.size)
+            header = _peek_buffer(buf, name)
+            size = 4096
+            while header is None:
+                more = source.read(size)
+                if not more:
+                    break
+                buf += more
+                header = _peek_buffer(buf, name)
+                size *= 4
+
+        if header is None:
+            raise ClassError('truncated classfile')
+
+        return header
 
     @staticmethod
     def is_classfile(source):
@@ -64,11 +207,111 @@ class ClassFile(object):
 
         return result
 
+    def _load_body(self):
+        if self._body is None:
+            return
+
+        buf, offset = self._body
+        self._fields, offset = read_members(buf, offset, self._cp, Field,
+            self._descriptor_cache)
+        self._methods, offset = read_members(buf, offset, self._cp, Method,
+            self._descriptor_cache)
+        self._attributes, offset = read_attributes(buf, offset, self._cp)
+        self._body = None
+        self._loaded = (tuple(self._fields), tuple(self._methods),
+            tuple(self._attributes))
+
+    def to_bytes(self):
+        """
+        Returns the class file as bytes. Anything that hasn't changed
+        since it was loaded is copied as is, see PoolWriter.
+        """
+        writer = PoolWriter(self._cp)
+
+        current = (tuple(self._fields), tuple(self._methods),
+            tuple(self._attributes))
+        if self._body is not None or (self._source_body is not None and
+                current == self._loaded):
+            buf, offset = self._source_body
+            body = slice_bytes(buf, offset, len(buf))
+        else:
+            body = b''.join((
+                write_members(current[0], writer),
+                write_members(current[1], writer),
+                write_attributes(current[2], writer)
+            ))
+
+        return b''.join((
+            _HEADER.pack(0xCAFEBABE, self._version[1], self._version[0]),
+            writer.to_bytes(),
+            _CLASS_INFO.pack(self._access_flags, self._this or 0,
+                self._super or 0, len(self._interfaces)),
+            struct.pack('>%dH' % len(self._interfaces), *self._interfaces),
+            body
+        ))
+
+    def _class_name(self, index):
+        constant = self._cp.get(index)
+        return None if constant is None else constant.name
+
+    @property
+    def access_flags(self):
+        """Returns the access flags of the class as an int."""
+        return self._access_flags
+
+    @property
+    def this(self):
+        """Returns the name of this class."""
+        return self._class_name(self._this) if self._this else None
+
+    @property
+    def super_class(self):
+        """
+        Returns the name of the superclass, or `None` for
+        java.lang.Object.
+        """
+        return self._class_name(self._super) if self._super else None
+
+    @property
+    def interfaces(self):
+        """Returns a list of the names of the interfaces implemented."""
+        return [self._class_name(i) for i in self._interfaces]
+
+    @property
+    def fields(self):
+        """Returns a list of the fields of the class, as Field objects."""
+        self._load_body()
+        return self._fields
+
+    @property
+    def methods(self):
+        """Returns a list of the methods of the class, as Method objects."""
+        self._load_body()
+        return self._methods
+
+    @property
+    def attributes(self):
+        """
+        Returns a list of the attributes of the class, as Attribute
+        objects whose bodies are only read when asked for.
+        """
+        self._load_body()
+        return self._attributes
+
     @property
     def constants(self):
         """Returns the class constant pool."""
         return self._cp
 
+    def compact_constants(self, strings=None):
+        """
+        Returns the constant pool as a read-only CompactPool, interning
+        its strings into the StringTable `strings` if one is given. Meant
+        for keeping many pools in memory at once.
+        """
+        return CompactPool.from_pool(self._cp, strings,
+            self._descriptor_cache)
+
     @property
     def version(self):
         """Returns a tuple of (major_version, minor_version)."""
@@ -80,6 +323,11 @@ class ClassFile(object):
         Returns a human-readable string representing the version of Java used
         to construct this ClassFile.
         """
+        major = self.version[0]
+        if major > 0x32:
+            # Java SE 7 onwards, one major version per release.
+            return "Java SE %d" % (major - 44)
+
         return {
             0x2D: "JDK 1.1",
             0x2E: "JDK 1.2",
@@ -87,4 +335,43 @@ class ClassFile(object):
             0x30: "JDK 1.4",
             0x31: "J2SE 5.0",
             0x32: "J2SE 6.0"
-        }.get(self.version[0], "unknown")
+        }.get(major, "unknown")
+
+
+def _peek_buffer(buf, name=True):
+    """
+    Returns the ClassHeader of the class at the start of `buf`, or `None`
+    if `buf` ends before enough of the class has been seen.
+    """
+    if len(buf) < _HEADER.size:
+        return None
+
+    magic_number, ver_min, ver_maj = _HEADER.unpack_from(buf, 0)
+    if magic_number != 0xCAFEBABE:
+        raise ClassError('not a valid classfile')
+
+    if not name:
+        return ClassHeader((ver_maj, ver_min), None)
+
+    try:
+        pool = pool_offsets(buf, _HEADER.size)
+    except ConstantError as e:
+        raise ClassError(str(e))
+    if pool is None or pool[1] + 4 > len(buf):
+        return None
+
+    offsets, end = pool
+    # Skip the access flags to get to this_class, then follow it through
+    # the CONSTANT_Class to its name.
+    this, = _U2.unpack_from(buf, end + 2)
+    if not 0 < this < len(offsets) or not offsets[this]:
+        raise ClassError('not a valid classfile')
+    name_index, = _U2.unpack_from(buf, offsets[this] + 1)
+    if not 0 < name_index < len(offsets) or not offsets[name_index]:
+        raise ClassError('not a valid classfile')
+    start = offsets[name_index] + 1
+    length, = _U2.unpack_from(buf, start)
+    this_name = slice_bytes(buf, start + 2, start + 2 + length)
+
+    return ClassHeader((ver_maj, ver_min),
+        decode_utf8(this_name).replace('/', '.'))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['CompactPool', 'StringTable']
+
+from array import array
+
+from .constants import (
+    ConstantType,
+    ConstantClass,
+    ConstantString,
+    ConstantField,
+    ConstantMethod,
+    ConstantInterface,
+    _MEMBER_TAGS,
+    _VALUE_TYPES,
+    _LINKAGE_TAGS
+)
+from ..util.compat import xrange, decode_utf8
+from ..descriptor import (
+    shared_cache,
+    to_field_descriptor,
+    to_method_descriptor
+)
+
+# Stands in for "no string" in the string ID arrays.
+_NONE = 0xFFFFFFFF
+
+
+class StringTable(object):
+    """
+    Interns strings to small integer IDs. Sharing one table between every
+    CompactPool of a classpath stores each class name, member name and
+    descriptor once, however many classes refer to it.
+    """
+    def __init__(self):
+        self._strings = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __getitem__(self, string_id):
+        return self._strings[string_id]
+
+    def add(self, string):
+        """Returns the ID of `string`, adding it if it's new."""
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = self._ids[string] = len(self._strings)
+            self._strings.append(string)
+        return string_id
+
+    def find(self, string):
+        """Returns the ID of `string`, or `None` if it was never added."""
+        return self._ids.get(string)
+
+
+class CompactPool(object):
+    """
+    A read-only constant pool stored as parallel arrays of tags, on-disk
+    indexes and string IDs, taking a fraction of the memory of the
+    namedtuples in a ConstantPool. Constants are built as the usual
+    namedtuples only when they're looked at, and `find()` and
+    `find_one()` filter on the arrays before building anything.
+
+    For references `_first` is the class name, `_second` the member name
+    and `_third` the descriptor. For classes and strings only `_first` is
+    used, holding the name or value.
+    """
+    def __init__(self, strings=None, descriptor_cache=None):
+        self.strings = strings if strings is not None else StringTable()
+        self._descriptor_cache = descriptor_cache or shared_cache
+
+        self._tags = array('B')
+        self._disk = array('H')
+        self._first = array('I')
+        self._second = array('I')
+        self._third = array('I')
+        # Numeric constants, and the whole of method handles, method types,
+        # dynamic constants, modules and packages, by position, which are
+        # rare enough that a dict beats a sparse array.
+        self._values = {}
+
+    @classmethod
+    def from_pool(cls, cp, strings=None, descriptor_cache=None):
+        """
+        Returns a CompactPool holding the same constants as the
+        ConstantPool `cp`. A pool that hasn't been queried yet is copied
+        straight from its raw entries without building any constants.
+        """
+        pool = cls(strings, descriptor_cache or cp._descriptor_cache)
+        if cp._raw is not None and not cp._resolved:
+            pool._add_raw(cp)
+        else:
+            for constant in cp.find():
+                pool.add(constant)
+        return pool
+
+    def _append(self, tag, disk_index, first=_NONE, second=_NONE,
+            third=_NONE):
+        self._tags.append(tag)
+        self._disk.append(disk_index)
+        self._first.append(first)
+        self._second.append(second)
+        self._third.append(third)
+
+    def _add_raw(self, cp):
+        buf, base, tags, a, b, values = cp._raw
+        add = self.strings.add
+        raw = cp._utf8
+
+        def utf8(index):
+            return decode_utf8(raw(index))
+
+        for index in xrange(1, len(tags)):
+            tag = tags[index]
+            if tag == ConstantType.CLASS:
+                self._append(tag, index, add(cp._class_name(a[index])))
+            elif tag == ConstantType.STRING:
+                self._append(tag, index, add(utf8(a[index])))
+            elif tag in _VALUE_TYPES:
+                self._values[len(self._tags)] = values[index]
+                self._append(tag, index)
+            elif tag in _LINKAGE_TAGS:
+                self._values[len(self._tags)] = cp._build(index)
+                self._append(tag, index)
+            elif tag in _MEMBER_TAGS:
+                type_ = b[index]
+                self._append(tag, index,
+                    add(cp._class_name(a[a[index]])),
+                    add(utf8(a[type_])),
+                    add(utf8(b[type_])))
+
+    def add(self, constant):
+        """Adds a Constant namedtuple to the pool."""
+        add = self.strings.add
+        tag = constant.tag
+        if tag == ConstantType.CLASS:
+            self._append(tag, constant.disk_index, add(constant.name))
+        elif tag == ConstantType.STRING:
+            self._append(tag, constant.disk_index, add(constant.value))
+        elif tag in _VALUE_TYPES:
+            self._values[len(self._tags)] = constant.value
+            self._append(tag, constant.disk_index)
+        elif tag in _LINKAGE_TAGS:
+            self._values[len(self._tags)] = constant
+            self._append(tag, constant.disk_index)
+        elif tag == ConstantType.FIELD:
+            self._append(tag, constant.disk_index, add(constant.class_name),
+                add(constant.name), add(to_field_descriptor(
+                    constant.of_type)))
+        elif tag in _MEMBER_TAGS:
+            self._append(tag, constant.disk_index, add(constant.class_name),
+                add(constant.name), add(to_method_descriptor(
+                    constant.takes, constant.returns)))
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __iter__(self):
+        return self.find()
+
+    def constant(self, position):
+        """Builds the namedtuple for the constant at `position`."""
+        tag = self._tags[position]
+        disk_index = self._disk[position]
+        strings = self.strings
+
+        if tag == ConstantType.CLASS:
+            return ConstantClass(tag, disk_index,
+                strings[self._first[position]])
+        elif tag == ConstantType.STRING:
+            return ConstantString(tag, disk_index,
+                strings[self._first[position]])
+        elif tag in _VALUE_TYPES:
+            return _VALUE_TYPES[tag](tag, disk_index, self._values[position])
+        elif tag in _LINKAGE_TAGS:
+            return self._values[position]
+
+        class_name = strings[self._first[position]]
+        name = strings[self._second[position]]
+        descriptor = strings[self._third[position]]
+        if tag == ConstantType.FIELD:
+            return ConstantField(tag, disk_index, class_name, name,
+                self._descriptor_cache.field(descriptor))
+
+        takes, returns = self._descriptor_cache.method(descriptor)
+        if tag == ConstantType.METHOD:
+            return ConstantMethod(tag, disk_index, class_name, name, takes,
+                returns)
+        return ConstantInterface(tag, disk_index, class_name, name, takes,
+            returns)
+
+    def get(self, disk_index):
+        """
+        Returns the constant at the on-disk index `disk_index`, or `None`
+        if there is no such constant.
+        """
+        try:
+            return self.constant(self._disk.index(disk_index))
+        except (ValueError, OverflowError):
+            return None
+
+    def find(self, tag=None, f=None, class_name=None, name=None):
+        """
+        Yields all constants from the pool that match the criteria, with
+        the same meaning as `ConstantPool.find()`.
+        """
+        tags = self._tags
+        class_id = name_id = None
+        if class_name is not None:
+            class_id = self.strings.find(class_name)
+            if class_id is None:
+                return
+        if name is not None:
+            name_id = self.strings.find(name)
+            if name_id is None:
+                return
+
+        first = self._first
+        second = self._second
+        for position in xrange(len(tags)):
+            t = tags[position]
+            if tag is not None and t != tag:
+                continue
+
+            if class_id is not None:
+                if t != ConstantType.CLASS and t not in _MEMBER_TAGS:
+                    continue
+                if first[position] != class_id:
+                    continue
+
+            if name_id is not None and (t not in _MEMBER_TAGS or
+                    second[position] != name_id):
+                continue
+
+            constant = self.constant(position)
+            if f is not None and not f(constant):
+                continue
+
+            yield constant
+
+    def find_one(self, tag=None, f=None, class_name=None, name=None):
+        """
+        Returns the first matching constant from the pool,
+        or `None` if there were no matches.
+        """
+        for constant in self.find(tag, f, class_name, name):
+            return constant
+
+        return None
@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-__all__ = ['ConstantError']
+__all__ = ['ConstantError', 'pool_offsets']
 
+import struct
+from array import array
+from timeit import default_timer
 from collections import namedtuple
 
-from ..util import StreamReader
-from ..descriptor import method_descriptor, field_descriptor
+from .. import instrument
+from ..util import slice_bytes
+from ..util.compat import xrange, intern, iteritems, decode_utf8
+from ..descriptor import shared_cache
 
 
 class ConstantType(object):
@@ -20,6 +25,12 @@ class ConstantType(object):
     DOUBLE = 6
     NAME_AND_TYPE = 12
     UTF8 = 1
+    METHOD_HANDLE = 15
+    METHOD_TYPE = 16
+    DYNAMIC = 17
+    INVOKE_DYNAMIC = 18
+    MODULE = 19
+    PACKAGE = 20
 
 Constant = namedtuple('Constant', 'tag disk_index')
 ConstantClass = namedtuple('ConstantClass', Constant._fields + ('name',))
@@ -33,16 +44,179 @@ ConstantMethod = namedtuple('ConstantMethod',
 ConstantField = namedtuple('ConstantField',
         Constant._fields + ('class_name', 'name', 'of_type'))
 ConstantInterface = namedtuple('ConstantInterface',
-        Constant._fields + ('class_name', 'name', 'of_type'))
+        Constant._fields + ('class_name', 'name', 'takes', 'returns'))
+# `reference_index` is the on-disk index of the field, method or interface
+# method handled, and `bootstrap_index` an index into the class's
+# BootstrapMethods attribute.
+ConstantMethodHandle = namedtuple('ConstantMethodHandle',
+        Constant._fields + ('reference_kind', 'reference_index'))
+ConstantMethodType = namedtuple('ConstantMethodType',
+        Constant._fields + ('takes', 'returns'))
+ConstantDynamic = namedtuple('ConstantDynamic',
+        Constant._fields + ('bootstrap_index', 'name', 'of_type'))
+ConstantInvokeDynamic = namedtuple('ConstantInvokeDynamic',
+        Constant._fields + ('bootstrap_index', 'name', 'takes', 'returns'))
+ConstantModule = namedtuple('ConstantModule', Constant._fields + ('name',))
+ConstantPackage = namedtuple('ConstantPackage', Constant._fields + ('name',))
+
+_TAG_NAMES = dict(
+    (v, k) for k, v in vars(ConstantType).items() if k.isupper()
+)
+
+_MEMBER_TAGS = frozenset((
+    ConstantType.FIELD,
+    ConstantType.METHOD,
+    ConstantType.INTERFACE
+))
+
+# Entries made of two u2s, mostly constant pool indexes.
+_REF_TAGS = _MEMBER_TAGS | frozenset((
+    ConstantType.NAME_AND_TYPE,
+    ConstantType.DYNAMIC,
+    ConstantType.INVOKE_DYNAMIC
+))
+
+# Entries made of a single constant pool index.
+_INDEX_TAGS = frozenset((
+    ConstantType.CLASS,
+    ConstantType.STRING,
+    ConstantType.METHOD_TYPE,
+    ConstantType.MODULE,
+    ConstantType.PACKAGE
+))
+
+# The tags added for invokedynamic and modules since Java 7.
+_LINKAGE_TAGS = frozenset((
+    ConstantType.METHOD_HANDLE,
+    ConstantType.METHOD_TYPE,
+    ConstantType.DYNAMIC,
+    ConstantType.INVOKE_DYNAMIC,
+    ConstantType.MODULE,
+    ConstantType.PACKAGE
+))
+
+_U1 = struct.Struct('>B')
+_U2 = struct.Struct('>H')
+_U1U2 = struct.Struct('>BH')
+_U2U2 = struct.Struct('>HH')
+_VALUE_STRUCTS = {
+    ConstantType.INTEGER: struct.Struct('>i'),
+    ConstantType.FLOAT: struct.Struct('>f'),
+    ConstantType.LONG: struct.Struct('>q'),
+    ConstantType.DOUBLE: struct.Struct('>d')
+}
+_VALUE_TYPES = {
+    ConstantType.INTEGER: ConstantInteger,
+    ConstantType.FLOAT: ConstantFloat,
+    ConstantType.LONG: ConstantLong,
+    ConstantType.DOUBLE: ConstantDouble
+}
+
+# On-disk size of every entry by tag, including the tag itself. UTF8 entries
+# are marked -1 as their size varies, and unknown tags 0.
+_ENTRY_SIZES = [0] * 256
+_ENTRY_SIZES[ConstantType.UTF8] = -1
+for _tag, _size in ((ConstantType.CLASS, 3), (ConstantType.STRING, 3),
+        (ConstantType.FIELD, 5), (ConstantType.METHOD, 5),
+        (ConstantType.INTERFACE, 5), (ConstantType.NAME_AND_TYPE, 5),
+        (ConstantType.INTEGER, 5), (ConstantType.FLOAT, 5),
+        (ConstantType.LONG, 9), (ConstantType.DOUBLE, 9),
+        (ConstantType.METHOD_HANDLE, 4), (ConstantType.METHOD_TYPE, 3),
+        (ConstantType.DYNAMIC, 5), (ConstantType.INVOKE_DYNAMIC, 5),
+        (ConstantType.MODULE, 3), (ConstantType.PACKAGE, 3)):
+    _ENTRY_SIZES[_tag] = _size
+_ENTRY_SIZES = tuple(_ENTRY_SIZES)
+del _tag, _size
+
+
+class ConstantError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+
+
+def pool_offsets(buf, offset=0):
+    """
+    Walks the constant pool in `buf` starting at `offset` without decoding
+    any of it. Returns a tuple of (offsets, end), where `offsets[i]` is the
+    position of the tag of entry `i` and `end` the offset just past the
+    pool, or `None` if `buf` ends before the pool does.
+    """
+    # Indexing a bytearray gives ints directly, which is much cheaper than
+    # unpacking each byte.
+    if not isinstance(buf, bytearray):
+        buf = bytearray(buf)
+
+    if offset + 2 > len(buf):
+        return None
+
+    pool_count = buf[offset] << 8 | buf[offset + 1]
+    offset += 2
+    offsets = array('I', [0]) * pool_count
+    position = 1
+    sizes = _ENTRY_SIZES
+
+    try:
+        while position < pool_count:
+            offsets[position] = offset
+            size = sizes[buf[offset]]
+            if size == -1:
+                offset += 3 + (buf[offset + 1] << 8 | buf[offset + 2])
+                position += 1
+            elif size == 9:
+                # Longs and doubles take up two entries.
+                offset += 9
+                position += 2
+            elif size:
+                offset += size
+                position += 1
+            else:
+                raise ConstantError('invalid constant type %r' %
+                    buf[offset])
+    except IndexError:
+        return None
+
+    if offset > len(buf):
+        return None
+
+    return offsets, offset
 
 
 class ConstantPool(object):
-    def __init__(self, source=None, collect_stats=True):
+    def __init__(self, source=None, collect_stats=None,
+            descriptor_cache=None):
         """
         Constructs a new constants pool, optionally
-        loading it from the given `source`.
+        loading it from the given `source`. Descriptors are parsed
+        through `descriptor_cache`, a DescriptorCache, or the shared
+        cache if none is given. Every pool read is added to
+        `collect_stats` if it is a PoolStats.
         """
         self._constants = []
+        self._descriptor_cache = descriptor_cache or shared_cache
+        # This used to be a flag that did nothing.
+        if isinstance(collect_stats, bool):
+            collect_stats = None
+        self._stats = collect_stats
+
+        # Secondary indexes, each mapping a key to the list of constants
+        # filed under it in pool order. See `_index_keys()`.
+        self._by_tag = {}
+        self._by_disk_index = {}
+        self._by_class = {}
+        self._by_member = {}
+
+        # The raw pool as loaded, if any, and whether its constants have
+        # been built yet. See `read_from_buffer()`. Until they all have,
+        # constants of a single tag are built and kept here by tag, as
+        # queries on just that tag ask for them.
+        self._raw = None
+        self._resolved = True
+        self._tag_buckets = None
+
+        # The next free on-disk index, and the indexes of every constant
+        # added or removed since loading, for `PoolWriter`.
+        self._next_index = 1
+        self._dirty = set()
 
         if source is not None:
             self.read_from_file(source)
@@ -52,161 +226,461 @@ class ConstantPool(object):
         Reads in a constant pool from `source`, assuming the
         cursor is positioned at the pool length prelude.
         """
-        sr = StreamReader(source)
+        data = source.read()
+        end = self.read_from_buffer(data)
+
+        # Leave the cursor just past the pool, as if we had read it
+        # piece by piece.
+        try:
+            source.seek(end - len(data), 1)
+        except (AttributeError, IOError):
+            pass
+
+    def read_from_buffer(self, buf, offset=0):
+        """
+        Reads in a constant pool from `buf`, which may be any object
+        supporting the buffer protocol (str, bytearray, memoryview, mmap),
+        starting at `offset`. Returns the offset of the first byte after
+        the pool. A str is kept and sliced as constants are built. From
+        any other buffer the bytes of the pool are copied out, and `buf`
+        itself is not kept.
+
+        Only the raw entries are decoded here. Constants are built the
+        first time the pool is queried, only those of the tag asked for
+        if a query is on nothing else, or one at a time through `get()`.
+        """
+        if not self._resolved:
+            self._resolve()
+
+        rec = instrument.active()
+        if rec is not None:
+            started = default_timer()
 
         # Get the number of entries in the constant pool, with
         # each long and double counting as two entries.
-        pool_count = sr.read('>H')[0]
+        pool_count, = _U2.unpack_from(buf, offset)
+        offset += 2
+        start = offset
         position = 1
 
-        # Store our temporary indices to be remapped after
-        # loading from the stream.
-        temporary_map = {}
+        # The raw pool is kept as parallel arrays indexed by on-disk
+        # position. For references `a` and `b` are the indexes they point
+        # to, for UTF8 entries the start and end of the string in `buf`,
+        # and for method handles the kind and index of the reference.
+        tags = array('B', [0]) * pool_count
+        a = array('I', [0]) * pool_count
+        b = array('I', [0]) * pool_count
+        values = {}
 
         while position < pool_count:
-            tag, = sr.read('>B')
-            tmp = dict(tag=tag)
-
-            # All three of these have the same on-disk structure.
-            if tag in (ConstantType.METHOD,
-                    ConstantType.FIELD, ConstantType.INTERFACE):
-                tmp['class_index'], tmp['type_index'] = sr.read('>HH')
-            elif tag == ConstantType.CLASS:
-                tmp['name_index'], = sr.read('>H')
-            elif tag == ConstantType.STRING:
-                tmp['string_index'], = sr.read('>H')
-            elif tag == ConstantType.INTEGER:
-                tmp['value'], = sr.read('>i')
-            elif tag == ConstantType.FLOAT:
-                tmp['value'], = sr.read('>f')
-            elif tag == ConstantType.LONG:
-                tmp['value'], = sr.read('>q')
-            elif tag == ConstantType.DOUBLE:
-                tmp['value'], = sr.read('>d')
-            elif tag == ConstantType.NAME_AND_TYPE:
-                tmp.update(zip(
-                    ['name_index', 'descriptor_index'],
-                    sr.read('>HH')
-                ))
+            tag, = _U1.unpack_from(buf, offset)
+            offset += 1
+            tags[position] = tag
+
+            # All seven of these have the same on-disk structure.
+            if tag in _REF_TAGS:
+                a[position], b[position] = _U2U2.unpack_from(buf, offset)
+                offset += 4
+            elif tag in _INDEX_TAGS:
+                a[position], = _U2.unpack_from(buf, offset)
+                offset += 2
+            elif tag == ConstantType.METHOD_HANDLE:
+                a[position], b[position] = _U1U2.unpack_from(buf, offset)
+                offset += 3
             elif tag == ConstantType.UTF8:
-                length, = sr.read('>H')
-                tmp['value'], = sr.read('>%ss' % length)
+                length, = _U2.unpack_from(buf, offset)
+                a[position] = offset + 2
+                offset += 2 + length
+                b[position] = offset
+            elif tag in _VALUE_STRUCTS:
+                st = _VALUE_STRUCTS[tag]
+                values[position], = st.unpack_from(buf, offset)
+                offset += st.size
+            else:
+                raise ConstantError('invalid constant type %r' % tag)
 
-            temporary_map[position] = tmp
             position += 2 if tag in (ConstantType.DOUBLE,
                     ConstantType.LONG) else 1
 
-        # Now that we have the complete map, we can create our
-        # internal constants and get rid of the cruft.
-        for index, constant in temporary_map.iteritems():
-            tag = constant['tag']
-            if tag == ConstantType.CLASS:
-                name = temporary_map[constant['name_index']]['value']
-                name = name.replace('/', '.')
-                tmp = ConstantClass(tag, index, name)
-            elif tag == ConstantType.STRING:
-                value = temporary_map[constant['string_index']]['value']
-                tmp = ConstantString(tag, index, value)
-            elif tag == ConstantType.INTEGER:
-                tmp = ConstantInteger(tag, index, constant['value'])
-            elif tag == ConstantType.FLOAT:
-                tmp = ConstantFloat(tag, index, constant['value'])
-            elif tag == ConstantType.LONG:
-                tmp = ConstantLong(tag, index, constant['value'])
-            elif tag == ConstantType.DOUBLE:
-                tmp = ConstantDouble(tag, index, constant['value'])
-            elif tag == ConstantType.NAME_AND_TYPE:
-                # Will be inlined by anything that needs it.
-                continue
-            elif tag == ConstantType.UTF8:
-                # Will be inlined by anything that needs it.
-                continue
-            elif tag in (9, 10, 11):
-                class_ = temporary_map[constant['class_index']]
-                name = temporary_map[class_['name_index']]['value']
-                name = name.replace('/', '.')
-                type_ = temporary_map[constant['type_index']]
-                type_name = temporary_map[type_['name_index']]['value']
-                descriptor = temporary_map[type_['descriptor_index']]['value']
-
-                if tag == ConstantType.METHOD:
-                    args, returns = method_descriptor(descriptor)
-                    tmp = ConstantMethod(tag, index, name, type_name, args,
-                        returns)
-                elif tag == ConstantType.FIELD:
-                    of_type = field_descriptor(descriptor)
-                    tmp = ConstantField(tag, index, name, type_name, of_type)
-                elif tag == ConstantType.INTERFACE:
-                    args, returns = method_descriptor(descriptor)
-                    tmp = ConstantInterface(tag, index, name, type_name, args,
-                        returns)
-            else:
-                raise RuntimeError('Invalid constant type.')
+        base = 0
+        if not isinstance(buf, bytes):
+            # Mutable or mapped buffers may change or go away under us, so
+            # keep our own copy of just the pool.
+            buf = slice_bytes(buf, start, offset)
+            base = start
+
+        self._raw = (buf, base, tags, a, b, values)
+        # Where the entries (without the count) are found in `buf`.
+        self._extent = (start - base, offset - base)
+        self._next_index = max(self._next_index, pool_count)
+        self._resolved = False
+        self._tag_buckets = {}
+        self._decoded = {}
+        self._names = {}
+        self._descriptors = {}
+
+        if self._stats is not None:
+            self._stats.add_pool(self)
+
+        if rec is not None:
+            rec.add_time('pool.read', default_timer() - started)
+            rec.count('pool.entries', pool_count - 1)
+        return offset
+
+    def utf8(self, disk_index):
+        """
+        Returns the contents of the UTF8 entry at `disk_index` in the pool
+        as it was loaded (decoded to str on Python 3), or `None` if there
+        is no such entry. UTF8 entries are otherwise only seen inlined
+        into other constants.
+        """
+        if self._raw is None:
+            return None
+
+        tags = self._raw[2]
+        if not 0 < disk_index < len(tags):
+            return None
+        elif tags[disk_index] != ConstantType.UTF8:
+            return None
+        return decode_utf8(self._utf8(disk_index))
+
+    def _utf8(self, index):
+        buf, base, tags, a, b, values = self._raw
+        return slice_bytes(buf, a[index] - base, b[index] - base)
+
+    def _class_name(self, index):
+        """
+        Returns the dotted class name for the UTF8 entry `index`, shared
+        by every constant that refers to it.
+        """
+        name = self._names.get(index)
+        if name is None:
+            name = intern(decode_utf8(self._utf8(index)).replace('/', '.'))
+            self._names[index] = name
+        return name
+
+    def _descriptor(self, index, parse):
+        """
+        Returns `parse` (a DescriptorCache method) applied to the UTF8
+        entry `index`, looking each distinct descriptor in the pool up
+        only once.
+        """
+        if self._descriptors is None:
+            return parse(decode_utf8(self._utf8(index)))
+
+        parsed = self._descriptors.get(index)
+        if parsed is None:
+            parsed = parse(decode_utf8(self._utf8(index)))
+            self._descriptors[index] = parsed
+        return parsed
 
-            self.add(tmp)
+    def _decode(self, index):
+        """
+        Builds the constant at on-disk position `index` from the raw pool,
+        or returns `None` if nothing user-visible lives there.
+        """
+        constant = self._decoded.get(index)
+        if constant is None:
+            constant = self._build(index)
+            if constant is not None:
+                self._decoded[index] = constant
+        return constant
+
+    def _build(self, index):
+        """
+        Builds the constant at on-disk position `index` as it was loaded,
+        whether or not the pool has been resolved since.
+        """
+        buf, base, tags, a, b, values = self._raw
+        tag = tags[index]
+        if tag == ConstantType.CLASS:
+            constant = ConstantClass(tag, index, self._class_name(a[index]))
+        elif tag == ConstantType.STRING:
+            constant = ConstantString(tag, index,
+                decode_utf8(self._utf8(a[index])))
+        elif tag in _VALUE_TYPES:
+            constant = _VALUE_TYPES[tag](tag, index, values[index])
+        elif tag in _MEMBER_TAGS:
+            name = self._class_name(a[a[index]])
+            type_ = b[index]
+            type_name = intern(decode_utf8(self._utf8(a[type_])))
+
+            if tag == ConstantType.FIELD:
+                of_type = self._descriptor(b[type_],
+                    self._descriptor_cache.field)
+                constant = ConstantField(tag, index, name, type_name,
+                    of_type)
+            elif tag == ConstantType.METHOD:
+                args, returns = self._descriptor(b[type_],
+                    self._descriptor_cache.method)
+                constant = ConstantMethod(tag, index, name, type_name, args,
+                    returns)
+            else:
+                args, returns = self._descriptor(b[type_],
+                    self._descriptor_cache.method)
+                constant = ConstantInterface(tag, index, name, type_name,
+                    args, returns)
+        elif tag in _LINKAGE_TAGS:
+            constant = self._build_linkage(tag, index, a, b)
+        else:
+            # UTF8 and NameAndType entries are inlined by anything that
+            # needs them, and the second slot of a long or double is
+            # unusable.
+            return None
+
+        return constant
+
+    def _build_linkage(self, tag, index, a, b):
+        """Builds one of the constants in `_LINKAGE_TAGS`."""
+        if tag == ConstantType.METHOD_HANDLE:
+            # Array items are longs on Python 2, and these are exposed.
+            return ConstantMethodHandle(tag, index, int(a[index]),
+                int(b[index]))
+        elif tag == ConstantType.METHOD_TYPE:
+            args, returns = self._descriptor(a[index],
+                self._descriptor_cache.method)
+            return ConstantMethodType(tag, index, args, returns)
+        elif tag == ConstantType.MODULE:
+            return ConstantModule(tag, index,
+                intern(decode_utf8(self._utf8(a[index]))))
+        elif tag == ConstantType.PACKAGE:
+            return ConstantPackage(tag, index, self._class_name(a[index]))
+
+        type_ = b[index]
+        name = intern(decode_utf8(self._utf8(a[type_])))
+        if tag == ConstantType.DYNAMIC:
+            of_type = self._descriptor(b[type_],
+                self._descriptor_cache.field)
+            return ConstantDynamic(tag, index, int(a[index]), name, of_type)
+
+        args, returns = self._descriptor(b[type_],
+            self._descriptor_cache.method)
+        return ConstantInvokeDynamic(tag, index, int(a[index]), name, args,
+            returns)
+
+    def _resolve(self):
+        """Builds every constant still waiting in the raw pool."""
+        rec = instrument.active()
+        if rec is not None:
+            seen = set(self._decoded)
+            first = len(self._constants)
+
+        tags = self._raw[2]
+        for index in xrange(1, len(tags)):
+            constant = self._decode(index)
+            if constant is not None:
+                self._add(constant)
+
+        if rec is not None:
+            counts = {}
+            for constant in self._constants[first:]:
+                if constant.disk_index not in seen:
+                    counts[constant.tag] = counts.get(constant.tag, 0) + 1
+            for tag, n in iteritems(counts):
+                rec.count('pool.decoded.' + _TAG_NAMES[tag], n)
+
+        # The raw pool is kept so UTF8 entries can still be looked up.
+        self._resolved = True
+        self._tag_buckets = None
+        self._decoded = None
+        self._descriptors = None
+
+    def _tag_bucket(self, tag):
+        """
+        Returns every constant with the tag `tag` in pool order, building
+        only those from the raw pool, for a pool not yet resolved.
+        """
+        bucket = self._tag_buckets.get(tag)
+        if bucket is not None:
+            return bucket
+
+        rec = instrument.active()
+        bucket = list(self._by_tag.get(tag, ()))
+        decoded = self._decoded
+        built = 0
+        for index, t in enumerate(self._raw[2]):
+            if t != tag:
+                continue
+            new = index not in decoded
+            constant = self._decode(index)
+            if constant is not None:
+                bucket.append(constant)
+                built += new
+
+        if rec is not None and built:
+            rec.count('pool.decoded.' + _TAG_NAMES[tag], built)
+
+        self._tag_buckets[tag] = bucket
+        return bucket
+
+    def _index_keys(self, constant):
+        """Returns the (index, key) pairs `constant` is filed under."""
+        keys = [
+            (self._by_tag, constant.tag),
+            (self._by_disk_index, constant.disk_index)
+        ]
+
+        if constant.tag == ConstantType.CLASS:
+            keys.append((self._by_class, constant.name))
+        elif constant.tag in _MEMBER_TAGS:
+            keys.append((self._by_class, constant.class_name))
+            keys.append((self._by_member, (constant.class_name,
+                constant.name)))
+
+        return keys
+
+    def _unindex(self, constant):
+        for index, key in self._index_keys(constant):
+            bucket = index[key]
+            for i, c in enumerate(bucket):
+                if c is constant:
+                    del bucket[i]
+                    break
+            if not bucket:
+                del index[key]
+
+    def _candidates(self, tag, class_name, name):
+        """
+        Returns the smallest list of constants that can satisfy the
+        indexed criteria. The result still needs to be filtered.
+        """
+        if class_name is not None and name is not None:
+            return self._by_member.get((class_name, name), ())
+        elif class_name is not None:
+            return self._by_class.get(class_name, ())
+        elif tag is not None:
+            return self._by_tag.get(tag, ())
+        return self._constants
 
     def add(self, constant):
-        """Adds a Constant object to our internal mechanism."""
+        """
+        Adds a Constant object to our internal mechanism. If its
+        `disk_index` is `None` it is given the next free one. Returns the
+        constant as added.
+        """
+        if not self._resolved:
+            self._resolve()
+
+        if constant.disk_index is None:
+            constant = constant._replace(disk_index=self._next_index)
+        slots = 2 if constant.tag in (ConstantType.LONG,
+            ConstantType.DOUBLE) else 1
+        self._next_index = max(self._next_index,
+            constant.disk_index + slots)
+
+        self._add(constant)
+        self._dirty.add(constant.disk_index)
+        return constant
+
+    def _add(self, constant):
         self._constants.append(constant)
+        for index, key in self._index_keys(constant):
+            index.setdefault(key, []).append(constant)
 
-    def remove(self, tag=None, f=None):
+    def get(self, disk_index):
         """
-        Removes all matching constants from the pool that match
-        the criteria.
+        Returns the constant at the on-disk index `disk_index`, or `None`
+        if there is no such constant.
         """
-        def keep(constant):
-            if tag is not None and constant.tag != tag:
-                return False
+        if not self._resolved:
+            if not 0 < disk_index < len(self._raw[2]):
+                return None
 
-            if f is not None and not f(constant):
-                return False
+            rec = instrument.active()
+            if rec is None or disk_index in self._decoded:
+                return self._decode(disk_index)
 
-            return True
+            constant = self._decode(disk_index)
+            if constant is not None:
+                rec.count('pool.decoded.' + _TAG_NAMES[constant.tag])
+            return constant
 
-        self._constants[:] = [c for c in self._constants if keep(c)]
+        bucket = self._by_disk_index.get(disk_index)
+        return bucket[0] if bucket else None
 
-    def remove_one(self, tag=None, f=None, instance=None):
+    def remove(self, tag=None, f=None, class_name=None, name=None):
+        """
+        Removes all matching constants from the pool that match
+        the criteria.
+        """
+        if not self._resolved:
+            self._resolve()
+
+        matches = list(self.find(tag, f, class_name, name))
+        if not matches:
+            return
+
+        removed = set(id(c) for c in matches)
+        self._constants[:] = [
+            c for c in self._constants if id(c) not in removed
+        ]
+        for constant in matches:
+            self._unindex(constant)
+            self._dirty.add(constant.disk_index)
+
+    def remove_one(self, tag=None, f=None, instance=None, class_name=None,
+            name=None):
         """
         Removes the first constant from the pool that matches the given
-        criteria, returning it.
+        criteria, returning it. If `instance` is given, only that exact
+        constant will be removed.
         """
-        for i, constant in enumerate(self._constants):
-            if instance is not None and constant is instance:
-                return self._constants.pop(i)
+        if not self._resolved:
+            self._resolve()
 
-            if tag is not None and constant.tag != tag:
-                continue
+        if instance is None:
+            instance = self.find_one(tag, f, class_name, name)
+            if instance is None:
+                return None
 
-            if f is not None and not f(constant):
-                continue
+        for i, constant in enumerate(self._constants):
+            if constant is instance:
+                del self._constants[i]
+                self._unindex(constant)
+                self._dirty.add(constant.disk_index)
+                return constant
 
-            return self._constants.pop(i)
+        return None
 
-    def find(self, tag=None, f=None):
+    def find(self, tag=None, f=None, class_name=None, name=None):
         """
         Yields all constants from the pool that match the criteria.
+
+        `class_name` matches the class a constant refers to (the `name`
+        of a ConstantClass, or the `class_name` of a field, method or
+        interface method) and `name` the name of a member. Queries on
+        these and on `tag` are answered from indexes, and `f` is then
+        applied to whatever they leave. Until the pool has been queried on
+        anything else, a query on only `tag` (and `f`) builds only the
+        constants with that tag.
         """
-        for constant in self._constants:
+        if self._resolved:
+            candidates = self._candidates(tag, class_name, name)
+        elif tag is not None and class_name is None and name is None:
+            candidates = self._tag_bucket(tag)
+        else:
+            self._resolve()
+            candidates = self._candidates(tag, class_name, name)
+
+        for constant in candidates:
             if tag is not None and constant.tag != tag:
                 continue
 
+            if name is not None and (constant.tag not in _MEMBER_TAGS or
+                    constant.name != name):
+                continue
+
             if f is not None and not f(constant):
                 continue
 
             yield constant
 
-    def find_one(self, tag=None, f=None):
+    def find_one(self, tag=None, f=None, class_name=None, name=None):
         """
         Returns the first matching constant from the pool,
         or `None` if there were no matches.
         """
-        for constant in self._constants:
-            if tag is not None and constant.tag != tag:
-                continue
-
-            if f is not None and not f(constant):
-                continue
-
+        for constant in self.find(tag, f, class_name, name):
             return constant
 
         return None
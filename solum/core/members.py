@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = [
+    'Attribute',
+    'Field',
+    'Method',
+    'Code',
+    'ExceptionHandler',
+    'read_attributes',
+    'read_members',
+    'write_attributes',
+    'write_members'
+]
+
+import struct
+from collections import namedtuple
+
+from .bytecode import disassemble, constant_indexes
+from ..util import slice_bytes
+from ..util.compat import xrange
+from ..descriptor import shared_cache
+
+_U2 = struct.Struct('>H')
+_U2U4 = struct.Struct('>HI')
+_MEMBER = struct.Struct('>HHH')
+_CODE = struct.Struct('>HHI')
+_HANDLER = struct.Struct('>HHHH')
+
+ExceptionHandler = namedtuple('ExceptionHandler',
+        'start_pc end_pc handler_pc catch_type')
+
+
+class Attribute(object):
+    """
+    A named attribute whose body is only a range of the class file until
+    `info` is asked for.
+    """
+    __slots__ = ('name', '_buf', '_start', '_end', '_cp')
+
+    def __init__(self, name, buf, start, end, cp=None):
+        self.name = name
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._cp = cp
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __repr__(self):
+        return '<Attribute %s (%d bytes)>' % (self.name, len(self))
+
+    @property
+    def info(self):
+        """Returns the raw body of the attribute."""
+        return slice_bytes(self._buf, self._start, self._end)
+
+    def decode(self):
+        """
+        Returns the decoded body of attributes Solum understands (see
+        `_DECODERS`), or the raw body for any other attribute.
+        """
+        decoder = _DECODERS.get(self.name)
+        if decoder is None:
+            return self.info
+        return decoder(self)
+
+
+def read_attributes(buf, offset, cp):
+    """
+    Reads the attribute table in `buf` at `offset`, resolving names through
+    the ConstantPool `cp`. Returns a tuple of (attributes, end offset).
+    """
+    count, = _U2.unpack_from(buf, offset)
+    offset += 2
+
+    attributes = []
+    for _ in xrange(count):
+        name_index, length = _U2U4.unpack_from(buf, offset)
+        offset += 6
+        attributes.append(Attribute(cp.utf8(name_index), buf, offset,
+            offset + length, cp))
+        offset += length
+
+    return attributes, offset
+
+
+def write_attributes(attributes, writer):
+    """
+    Returns the attribute table for `attributes` as bytes, getting the
+    indexes of their names from the PoolWriter `writer`.
+    """
+    out = [_U2.pack(len(attributes))]
+    for attribute in attributes:
+        info = attribute.info
+        out.append(_U2U4.pack(writer.utf8(attribute.name), len(info)))
+        out.append(info)
+    return b''.join(out)
+
+
+def _find(attributes, name):
+    for attribute in attributes:
+        if attribute.name == name:
+            return attribute
+    return None
+
+
+class Field(namedtuple('Field', 'access_flags name descriptor attributes')):
+    # Set per instance by `read_members()`. It is not a field, so it stays
+    # out of comparisons and `_replace()`.
+    _descriptor_cache = shared_cache
+
+    def __getstate__(self):
+        # A DescriptorCache holds a lock, so it is left out of pickles.
+        return None
+
+    @property
+    def of_type(self):
+        """Returns the parsed type of the field, as in ConstantField."""
+        return self._descriptor_cache.field(self.descriptor)
+
+    @property
+    def constant_value(self):
+        """
+        Returns the constant the field is initialized to, or `None` if it
+        has no ConstantValue attribute.
+        """
+        attribute = _find(self.attributes, 'ConstantValue')
+        return None if attribute is None else attribute.decode()
+
+
+class Method(namedtuple('Method', 'access_flags name descriptor attributes')):
+    # See Field.
+    _descriptor_cache = shared_cache
+
+    def __getstate__(self):
+        return None
+
+    @property
+    def takes(self):
+        """Returns the parsed argument types, as in ConstantMethod."""
+        return self._descriptor_cache.method(self.descriptor)[0]
+
+    @property
+    def returns(self):
+        """Returns the parsed return type, as in ConstantMethod."""
+        return self._descriptor_cache.method(self.descriptor)[1]
+
+    @property
+    def code(self):
+        """
+        Returns the decoded Code attribute of the method, or `None` if it
+        is abstract or native.
+        """
+        attribute = _find(self.attributes, 'Code')
+        return None if attribute is None else attribute.decode()
+
+
+def read_members(buf, offset, cp, type_, descriptor_cache=None):
+    """
+    Reads a field or method table (depending on `type_`, which is Field or
+    Method) in `buf` at `offset`. The members parse their descriptors
+    through `descriptor_cache`, or the shared DescriptorCache if it is
+    `None`. Returns a tuple of (members, end offset).
+    """
+    count, = _U2.unpack_from(buf, offset)
+    offset += 2
+
+    members = []
+    for _ in xrange(count):
+        flags, name_index, descriptor_index = _MEMBER.unpack_from(buf,
+            offset)
+        attributes, offset = read_attributes(buf, offset + 6, cp)
+        member = type_(flags, cp.utf8(name_index),
+            cp.utf8(descriptor_index), attributes)
+        if descriptor_cache is not None:
+            member._descriptor_cache = descriptor_cache
+        members.append(member)
+
+    return members, offset
+
+
+def write_members(members, writer):
+    """The inverse of `read_members()`, see `write_attributes()`."""
+    out = [_U2.pack(len(members))]
+    for member in members:
+        out.append(_MEMBER.pack(member.access_flags, writer.utf8(member.name),
+            writer.utf8(member.descriptor)))
+        out.append(write_attributes(member.attributes, writer))
+    return b''.join(out)
+
+
+class Code(namedtuple('Code',
+        'max_stack max_locals code exception_table attributes')):
+    __slots__ = ()
+
+    @property
+    def line_numbers(self):
+        """
+        Returns a list of (start_pc, line_number) tuples from the
+        LineNumberTable, or `None` if there isn't one.
+        """
+        attribute = _find(self.attributes, 'LineNumberTable')
+        return None if attribute is None else attribute.decode()
+
+    def instructions(self):
+        """Yields every Instruction of the method body, in order."""
+        return disassemble(self.code)
+
+    def constant_indexes(self):
+        """
+        Yields the constant pool index of every instruction that refers to
+        one, in order.
+        """
+        return constant_indexes(self.code)
+
+
+def _decode_code(attribute):
+    buf, offset = attribute._buf, attribute._start
+    max_stack, max_locals, length = _CODE.unpack_from(buf, offset)
+    offset += 8
+    code = slice_bytes(buf, offset, offset + length)
+    offset += length
+
+    count, = _U2.unpack_from(buf, offset)
+    offset += 2
+    handlers = []
+    for _ in xrange(count):
+        handlers.append(ExceptionHandler(*_HANDLER.unpack_from(buf, offset)))
+        offset += 8
+
+    attributes, offset = read_attributes(buf, offset, attribute._cp)
+    return Code(max_stack, max_locals, code, handlers, attributes)
+
+
+def _decode_line_numbers(attribute):
+    buf, offset = attribute._buf, attribute._start
+    count, = _U2.unpack_from(buf, offset)
+    return [
+        struct.unpack_from('>HH', buf, offset + 2 + i * 4)
+        for i in xrange(count)
+    ]
+
+
+def _decode_constant_value(attribute):
+    index, = _U2.unpack_from(attribute._buf, attribute._start)
+    constant = attribute._cp.get(index)
+    return getattr(constant, 'value', None)
+
+
+def _decode_source_file(attribute):
+    index, = _U2.unpack_from(attribute._buf, attribute._start)
+    return attribute._cp.utf8(index)
+
+
+def _decode_exceptions(attribute):
+    buf, offset = attribute._buf, attribute._start
+    count, = _U2.unpack_from(buf, offset)
+    return [
+        attribute._cp.get(_U2.unpack_from(buf, offset + 2 + i * 2)[0]).name
+        for i in xrange(count)
+    ]
+
+
+_DECODERS = {
+    'Code': _decode_code,
+    'LineNumberTable': _decode_line_numbers,
+    'ConstantValue': _decode_constant_value,
+    'SourceFile': _decode_source_file,
+    'Exceptions': _decode_exceptions
+}
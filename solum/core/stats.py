@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['PoolStats']
+
+import struct
+from array import array
+from collections import Counter
+
+from .constants import ConstantType, _TAG_NAMES
+from ..util.compat import PY3, iteritems, decode_utf8
+
+# UTF8 entries are bucketed by the bit length of their size, so bucket k
+# holds sizes from 2 ** (k - 1) to 2 ** k - 1 bytes (and bucket 0 empty
+# strings). Sizes are at most 0xFFFF.
+_UTF8_BUCKETS = 17
+
+# Every tag as a single byte, to count in the raw tags.
+_TAG_BYTES = [(tag, struct.pack('>B', tag)) for tag in _TAG_NAMES]
+
+
+class PoolStats(object):
+    """
+    Statistics over any number of classes: how many constants of each
+    type there are, how big UTF8 entries are, how often every member
+    descriptor is used and which class file versions are found.
+
+    Counts are kept in flat arrays and Counters rather than per constant,
+    so a PoolStats stays small however many classes go in, pickles
+    cheaply and can be merged with `update()` or `+`, for instance from
+    the workers of `collect_stats()`. Only pools as they were loaded are
+    counted, not constants added to them since.
+    """
+    def __init__(self):
+        self.classes = 0
+        self.pools = 0
+        self.tags = array('L', [0]) * 256
+        self.utf8_sizes = array('L', [0]) * _UTF8_BUCKETS
+        self.utf8_bytes = 0
+        self.descriptors = Counter()
+        self.versions = Counter()
+
+    def add_pool(self, cp):
+        """Adds the entries of the ConstantPool `cp`."""
+        if cp._raw is None:
+            return
+        buf, base, tags, a, b, values = cp._raw
+        self.pools += 1
+
+        # Index 0 and the second half of longs and doubles are tag 0.
+        raw_tags = tags.tobytes() if PY3 else tags.tostring()
+        counts = self.tags
+        for tag, byte in _TAG_BYTES:
+            counts[tag] += raw_tags.count(byte)
+
+        sizes = self.utf8_sizes
+        utf8 = ConstantType.UTF8
+        name_and_type = ConstantType.NAME_AND_TYPE
+        total = 0
+        descriptors = []
+        for index, tag in enumerate(tags):
+            if tag == utf8:
+                size = b[index] - a[index]
+                sizes[size.bit_length()] += 1
+                total += size
+            elif tag == name_and_type:
+                descriptors.append(cp._utf8(b[index]))
+        self.utf8_bytes += total
+        self.descriptors.update(descriptors)
+
+    def add_class(self, cf):
+        """Adds the ClassFile `cf`, its version and its constant pool."""
+        self.classes += 1
+        self.versions[cf.version] += 1
+        self.add_pool(cf.constants)
+
+    def update(self, other):
+        """Merges the counts of the PoolStats `other` into this one."""
+        self.classes += other.classes
+        self.pools += other.pools
+        for i, n in enumerate(other.tags):
+            self.tags[i] += n
+        for i, n in enumerate(other.utf8_sizes):
+            self.utf8_sizes[i] += n
+        self.utf8_bytes += other.utf8_bytes
+        self.descriptors.update(other.descriptors)
+        self.versions.update(other.versions)
+        return self
+
+    def __add__(self, other):
+        return PoolStats().update(self).update(other)
+
+    def report(self, top=20):
+        """
+        Returns a dict of the statistics: the number of `classes` and
+        `pools`, `constants` by type name, `utf8` with the `count` and
+        total `bytes` of UTF8 entries and how many fall in each power of
+        two of `sizes` (keyed by the largest size in the bucket), the
+        `top` most used `descriptors`, and `versions` as major.minor.
+        """
+        sizes = {}
+        for k, n in enumerate(self.utf8_sizes):
+            if n:
+                sizes[(1 << k) - 1] = int(n)
+
+        return {
+            'classes': self.classes,
+            'pools': self.pools,
+            'constants': dict(
+                (name, int(self.tags[tag]))
+                for tag, name in iteritems(_TAG_NAMES)
+            ),
+            'utf8': {
+                'count': int(self.tags[ConstantType.UTF8]),
+                'bytes': self.utf8_bytes,
+                'sizes': sizes
+            },
+            'descriptors': [
+                (decode_utf8(descriptor), n)
+                for descriptor, n in self.descriptors.most_common(top)
+            ],
+            'versions': dict(
+                ('%d.%d' % version, n)
+                for version, n in iteritems(self.versions)
+            )
+        }
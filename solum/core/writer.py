@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['PoolWriter', 'write_pool']
+
+import struct
+
+from .constants import (
+    ConstantType,
+    ConstantError,
+    pool_offsets,
+    _ENTRY_SIZES,
+    _MEMBER_TAGS,
+    _VALUE_STRUCTS,
+    _VALUE_TYPES
+)
+from ..util import slice_bytes
+from ..util.compat import xrange, encode_utf8
+from ..descriptor import to_field_descriptor, to_method_descriptor
+
+_U1 = struct.Struct('>B')
+_U1U2 = struct.Struct('>BH')
+_U1U2U2 = struct.Struct('>BHH')
+_U1U1U2 = struct.Struct('>BBH')
+_U2 = struct.Struct('>H')
+
+# Fills on-disk indexes that were handed out but never used: an empty
+# UTF8 entry.
+_FILLER = b'\x01\x00\x00'
+
+
+def write_pool(cp):
+    """Returns the ConstantPool `cp` as bytes, count included."""
+    return PoolWriter(cp).to_bytes()
+
+
+class PoolWriter(object):
+    """
+    Serializes a ConstantPool, re-emitting the pool it was loaded from
+    verbatim apart from the constants added or removed since.
+
+    Existing entries never move, as the rest of the class refers to them
+    by index. A changed constant is re-encoded in place, which only works
+    if its entry stays the same size, and removed constants are left
+    where they are. New constants are written at their own indexes after
+    the loaded pool, followed by any UTF8, Class and NameAndType entries
+    they need that the pool doesn't already have.
+    """
+    def __init__(self, cp):
+        self._cp = cp
+
+        if cp._raw is None:
+            self._count = 1
+            self._region = b''
+        else:
+            self._count = len(cp._raw[2])
+            start, end = cp._extent
+            self._region = slice_bytes(cp._raw[0], start, end)
+
+        # Entries needed by the constants being written, which go after
+        # every index `cp` has handed out.
+        self._next = max(self._count, cp._next_index)
+        self._extra = []
+
+        # Lookups of the UTF8, Class and NameAndType entries by their
+        # contents, only built if anything needs re-encoding.
+        self._utf8s = None
+        self._classes = None
+        self._nats = None
+
+    def _load_lookups(self):
+        self._utf8s = {}
+        self._classes = {}
+        self._nats = {}
+
+        if self._cp._raw is None:
+            return
+
+        buf, base, tags, a, b, values = self._cp._raw
+        for index in xrange(1, len(tags)):
+            tag = tags[index]
+            if tag == ConstantType.UTF8:
+                self._utf8s.setdefault(self._cp._utf8(index), index)
+            elif tag == ConstantType.CLASS:
+                self._classes.setdefault(a[index], index)
+            elif tag == ConstantType.NAME_AND_TYPE:
+                self._nats.setdefault((a[index], b[index]), index)
+
+    def _append(self, data, slots=1):
+        index = self._next
+        self._extra.append(data)
+        self._next += slots
+        return index
+
+    def utf8(self, value):
+        """Returns the index of a UTF8 entry for `value`, adding one."""
+        if self._utf8s is None:
+            self._load_lookups()
+
+        # Looked up by the encoded form, as the loaded pool's are.
+        value = encode_utf8(value)
+        index = self._utf8s.get(value)
+        if index is None:
+            index = self._utf8s[value] = self._append(
+                _U2.pack(len(value)).join((b'\x01', value)))
+        return index
+
+    def class_(self, name):
+        """
+        Returns the index of a Class entry for the dotted class `name`,
+        adding one.
+        """
+        name_index = self.utf8(name.replace('.', '/'))
+        index = self._classes.get(name_index)
+        if index is None:
+            index = self._classes[name_index] = self._append(
+                _U1U2.pack(ConstantType.CLASS, name_index))
+        return index
+
+    def name_and_type(self, name, descriptor):
+        """Returns the index of a NameAndType entry, adding one."""
+        key = (self.utf8(name), self.utf8(descriptor))
+        index = self._nats.get(key)
+        if index is None:
+            index = self._nats[key] = self._append(
+                _U1U2U2.pack(ConstantType.NAME_AND_TYPE, *key))
+        return index
+
+    def encode(self, constant):
+        """Returns the on-disk form of `constant`."""
+        tag = constant.tag
+        if tag == ConstantType.CLASS:
+            return _U1U2.pack(tag, self.utf8(constant.name.replace('.', '/')))
+        elif tag == ConstantType.STRING:
+            return _U1U2.pack(tag, self.utf8(constant.value))
+        elif tag in _VALUE_TYPES:
+            return _U1.pack(tag) + _VALUE_STRUCTS[tag].pack(constant.value)
+        elif tag == ConstantType.FIELD:
+            descriptor = to_field_descriptor(constant.of_type)
+        elif tag in (ConstantType.METHOD, ConstantType.INTERFACE):
+            descriptor = to_method_descriptor(constant.takes,
+                constant.returns)
+        elif tag == ConstantType.METHOD_HANDLE:
+            return _U1U1U2.pack(tag, constant.reference_kind,
+                constant.reference_index)
+        elif tag == ConstantType.METHOD_TYPE:
+            return _U1U2.pack(tag, self.utf8(to_method_descriptor(
+                constant.takes, constant.returns)))
+        elif tag == ConstantType.MODULE:
+            return _U1U2.pack(tag, self.utf8(constant.name))
+        elif tag == ConstantType.PACKAGE:
+            return _U1U2.pack(tag, self.utf8(constant.name.replace('.', '/')))
+        elif tag == ConstantType.DYNAMIC:
+            return _U1U2U2.pack(tag, constant.bootstrap_index,
+                self.name_and_type(constant.name,
+                to_field_descriptor(constant.of_type)))
+        elif tag == ConstantType.INVOKE_DYNAMIC:
+            return _U1U2U2.pack(tag, constant.bootstrap_index,
+                self.name_and_type(constant.name,
+                to_method_descriptor(constant.takes, constant.returns)))
+        else:
+            raise ConstantError('invalid constant type %r' % tag)
+
+        return _U1U2U2.pack(tag, self.class_(constant.class_name),
+            self.name_and_type(constant.name, descriptor))
+
+    def _follow_classes(self, patches):
+        """
+        Rewriting a Class entry in place would also change every member
+        reference pointing at it, whose constants still hold the old
+        name. Returns `patches` with those references added, to be
+        re-encoded against a Class entry for the name they expect, and
+        the Class entries sorted first so they can be reused.
+        """
+        moved = set(i for i, c in patches if c.tag == ConstantType.CLASS)
+        if not moved:
+            return patches
+
+        if self._utf8s is None:
+            self._load_lookups()
+        for key, index in list(self._classes.items()):
+            if index in moved:
+                del self._classes[key]
+
+        cp = self._cp
+        buf, base, tags, a, b, values = cp._raw
+        patches = list(patches)
+        for index in xrange(1, len(tags)):
+            if (tags[index] in _MEMBER_TAGS and a[index] in moved and
+                    index not in cp._dirty):
+                patches.append((index, cp.get(index)))
+
+        patches.sort(key=lambda p: p[1].tag != ConstantType.CLASS)
+        return patches
+
+    def to_bytes(self):
+        """
+        Returns the pool as bytes. Call this last, after anything that
+        may need new UTF8 entries (see `utf8()`).
+        """
+        cp = self._cp
+        if not cp._dirty and not self._extra and self._next == self._count:
+            return _U2.pack(self._count) + self._region
+
+        region = self._region
+        patches = []
+        added = {}
+        for index in sorted(cp._dirty):
+            constant = cp.get(index)
+            if constant is None:
+                # Removed, but the rest of the class may still point here.
+                continue
+            elif index >= self._count:
+                added[index] = constant
+            elif constant != cp._build(index):
+                patches.append((index, constant))
+
+        if patches:
+            patches = self._follow_classes(patches)
+            offsets, _ = pool_offsets(_U2.pack(self._count) + region)
+            region = bytearray(region)
+            for index, constant in patches:
+                if not offsets[index]:
+                    raise ConstantError('constant %d is the second half of '
+                        'a long or double' % index)
+                start = offsets[index] - 2
+                old_tag = region[start]
+                if _ENTRY_SIZES[old_tag] != _ENTRY_SIZES[constant.tag]:
+                    raise ConstantError('constant %d cannot change from '
+                        'type %d to %d in place' % (index, old_tag,
+                        constant.tag))
+                data = self.encode(constant)
+                region[start:start + len(data)] = data
+                if constant.tag == ConstantType.CLASS:
+                    self._classes.setdefault(_U1U2.unpack(data)[1], index)
+            region = bytes(region)
+
+        # Constants added after the loaded pool, each at its own index.
+        new = []
+        index = self._count
+        end = cp._next_index
+        while index < end:
+            constant = added.get(index)
+            if constant is None:
+                new.append(_FILLER)
+                index += 1
+                continue
+
+            new.append(self.encode(constant))
+            index += 2 if constant.tag in (ConstantType.LONG,
+                ConstantType.DOUBLE) else 1
+
+        if self._next > 0xFFFF:
+            raise ConstantError('too many constants (%d)' % self._next)
+
+        return b''.join([_U2.pack(self._next), region] + new + self._extra)
@@ -2,12 +2,36 @@
 # -*- coding: utf8 -*-
 __all__ = [
     "DescriptorError",
+    "DescriptorCache",
     "method_descriptor",
     "field_descriptor",
-    "split_descriptor"
+    "split_descriptor",
+    "to_field_descriptor",
+    "to_method_descriptor",
+    "shared_cache"
 ]
 
-from collections import namedtuple
+import re
+import threading
+from collections import OrderedDict
+
+# A single (possibly array) type. Group 1 holds the array dimensions and
+# group 2 a base type or group 3 a class type. Group 4 catches a class type
+# missing its terminating semicolon, and anything else is matched alone so
+# it can be skipped.
+_TOKEN = re.compile(r"(\[*)(?:([BCDFIJSZV])|(L[^;]*;))|(L)|.", re.S)
+_BASE_TYPES = {
+    "B": "byte",
+    "C": "char",
+    "D": "double",
+    "F": "float",
+    "I": "int",
+    "J": "long",
+    "S": "short",
+    "Z": "boolean",
+    "V": "void"
+}
+_BASE_CODES = dict((v, k) for k, v in _BASE_TYPES.items())
 
 class DescriptorError(Exception):
     def __init__(self, msg):
@@ -43,45 +67,112 @@ def split_descriptor(descriptor):
     Parses a descriptor in a manner compliant with section 4.4.1 of the 
     Java5 ClassFile Format Specification.
     """
-    d = descriptor
-    i = 0
+    if descriptor in _BASE_TYPES:
+        return (_BASE_TYPES[descriptor],)
+
     ret = []
-    post = ""
-    while i < len(d):
-        # Each "[" denotes another array dimension
-        if d[i] == "[":
-            post += "[]"
-        else:
+    for dims, base, class_, bad in _TOKEN.findall(descriptor):
+        if base:
+            type_ = _BASE_TYPES[base]
+        elif class_:
             # Class types being with a 'L' and are terminated by a ';'.
-            if d[i] == "L":
-                end = d.find(";", i)
-                if end == -1:
-                    raise DescriptorError("no terminating semicolon")
-                ret.append(d[i + 1:end].replace("/", "."))
-                i = end - 1
-            elif d[i] == "B":
-                ret.append("byte")
-            elif d[i] == "C":
-                ret.append("char")
-            elif d[i] == "D":
-                ret.append("double")
-            elif d[i] == "F":
-                ret.append("float")
-            elif d[i] == "I":
-                ret.append("int")
-            elif d[i] == "J":
-                ret.append("long")
-            elif d[i] == "S":
-                ret.append("short")
-            elif d[i] == "Z":
-                ret.append("boolean")
-            elif d[i] == "V":
-                ret.append("void")
-            
-            if post:
-                ret[-1] += post
-                post = ""
-            
-        i += 1
-    
+            type_ = class_[1:-1].replace("/", ".")
+        elif bad:
+            raise DescriptorError("no terminating semicolon")
+        else:
+            continue
+
+        # Each "[" denotes another array dimension
+        if dims:
+            type_ += "[]" * len(dims)
+
+        ret.append(type_)
+
     return tuple(ret)
+
+
+def to_field_descriptor(type_):
+    """
+    The inverse of `field_descriptor()`, turning a type such as
+    "java.lang.String[]" back into "[Ljava/lang/String;".
+    """
+    dims = 0
+    while type_.endswith("[]"):
+        type_ = type_[:-2]
+        dims += 1
+
+    code = _BASE_CODES.get(type_)
+    if code is None:
+        code = "L%s;" % type_.replace(".", "/")
+    return "[" * dims + code
+
+
+def to_method_descriptor(takes, returns):
+    """The inverse of `method_descriptor()`."""
+    return "(%s)%s" % (
+        "".join(to_field_descriptor(t) for t in takes),
+        to_field_descriptor(returns)
+    )
+
+
+class DescriptorCache(object):
+    """
+    A bounded LRU cache of parsed method and field descriptors, meant to
+    be shared by every ConstantPool loaded from the same classpath. It
+    is safe to use from several threads at once.
+    """
+    def __init__(self, max_size=16384):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Method descriptors always start with "(" and field descriptors
+        # never do, so both can share one mapping.
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, descriptor, parse):
+        with self._lock:
+            cache = self._cache
+            try:
+                parsed = cache.pop(descriptor)
+            except KeyError:
+                self.misses += 1
+                parsed = parse(descriptor)
+                if len(cache) >= self.max_size:
+                    cache.popitem(last=False)
+            else:
+                self.hits += 1
+
+            cache[descriptor] = parsed
+            return parsed
+
+    def method(self, descriptor):
+        """Cached equivalent of `method_descriptor(descriptor)`."""
+        return self._get(descriptor, method_descriptor)
+
+    def field(self, descriptor):
+        """Cached equivalent of `field_descriptor(descriptor)`."""
+        return self._get(descriptor, field_descriptor)
+
+    def clear(self):
+        """Empties the cache and resets its statistics."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns a dict with the number of `hits` and `misses` so far, and
+        the current and maximum `size` of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "max_size": self.max_size
+        }
+
+
+# The cache used by every ConstantPool that isn't given its own.
+shared_cache = DescriptorCache()
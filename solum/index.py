@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['SymbolIndex', 'SymbolIndexError', 'symbol_key']
+
+import os
+import json
+import mmap
+import struct
+
+from .scan import scan_jars
+from .core.constants import ConstantType
+from .util.compat import itervalues, replace_file, to_bytes, to_text
+
+_MAGIC = b'SLMX'
+_VERSION = 1
+# magic, version, doc count, key count, then the offsets of the doc
+# table, key table, postings and string blob.
+_HEADER = struct.Struct('<4sIIIQQQQ')
+_DOC = struct.Struct('<IIII')
+_KEY = struct.Struct('<IIII')
+_POSTING = struct.Struct('<I')
+
+# Once there are more segments than this, `update()` compacts them.
+_MAX_SEGMENTS = 16
+
+
+class SymbolIndexError(Exception):
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+
+
+def symbol_key(kind, class_name, name=None):
+    """
+    Returns the index key for a reference to the class `class_name` (kind
+    'c'), or to its method or field `name` (kind 'm' or 'f').
+    """
+    if name is None:
+        return '%s:%s' % (kind, class_name)
+    return '%s:%s.%s' % (kind, class_name, name)
+
+
+def _summary_keys(summary):
+    """Yields the key of every class, field and method the class refers to."""
+    for constant in summary.constants:
+        tag = constant.tag
+        if tag == ConstantType.CLASS:
+            yield symbol_key('c', constant.name)
+        elif tag in (ConstantType.METHOD, ConstantType.INTERFACE):
+            yield symbol_key('m', constant.class_name, constant.name)
+        elif tag == ConstantType.FIELD:
+            yield symbol_key('f', constant.class_name, constant.name)
+
+
+def _write_segment(path, docs, postings):
+    """
+    Writes a segment to `path`. `docs` is a list of (jar, entry) tuples and
+    `postings` maps each key to the sorted list of doc ids that refer to it.
+    Strings are stored as UTF-8, whose byte order is the order of the keys.
+    """
+    strings = []
+    string_offsets = {}
+    size = [0]
+
+    def intern_(value):
+        value = to_bytes(value)
+        offset = string_offsets.get(value)
+        if offset is None:
+            offset = string_offsets[value] = size[0]
+            strings.append(value)
+            size[0] += len(value)
+        return offset, len(value)
+
+    doc_table = []
+    for jar, entry in docs:
+        doc_table.append(_DOC.pack(*(intern_(jar) + intern_(entry))))
+
+    key_table = []
+    posting_table = []
+    position = 0
+    for key in sorted(postings):
+        ids = postings[key]
+        key_table.append(_KEY.pack(*(intern_(key) + (position, len(ids)))))
+        posting_table.append(struct.pack('<%dI' % len(ids), *ids))
+        position += len(ids)
+
+    doc_offset = _HEADER.size
+    key_offset = doc_offset + len(docs) * _DOC.size
+    posting_offset = key_offset + len(key_table) * _KEY.size
+    string_offset = posting_offset + position * _POSTING.size
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fout:
+        fout.write(_HEADER.pack(_MAGIC, _VERSION, len(docs),
+            len(key_table), doc_offset, key_offset, posting_offset,
+            string_offset))
+        fout.write(b''.join(doc_table))
+        fout.write(b''.join(key_table))
+        fout.write(b''.join(posting_table))
+        fout.write(b''.join(strings))
+    replace_file(tmp, path)
+
+
+class _Segment(object):
+    """A read-only, memory-mapped segment of a SymbolIndex."""
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0,
+            access=mmap.ACCESS_READ)
+
+        (magic, version, self.doc_count, self.key_count, self._docs,
+            self._keys, self._postings, self._strings) = _HEADER.unpack_from(
+            self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise SymbolIndexError('%s is not a symbol index segment' % path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start + length]
+
+    def _key(self, i):
+        return _KEY.unpack_from(self._map, self._keys + i * _KEY.size)
+
+    def _bisect(self, key):
+        """Returns the position of the first key not less than `key`."""
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, _, _ = self._key(mid)
+            if self._string(offset, length) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def doc(self, doc_id):
+        """Returns the (jar, entry) tuple for `doc_id`."""
+        jar_off, jar_len, entry_off, entry_len = _DOC.unpack_from(
+            self._map, self._docs + doc_id * _DOC.size)
+        return (to_text(self._string(jar_off, jar_len)),
+            to_text(self._string(entry_off, entry_len)))
+
+    def lookup(self, key, prefix=False):
+        """
+        Yields (key, doc ids) for `key`, or for every key starting with it
+        if `prefix` is `True`.
+        """
+        key = to_bytes(key)
+        i = self._bisect(key)
+        while i < self.key_count:
+            offset, length, position, count = self._key(i)
+            found = self._string(offset, length)
+            if found != key and not (prefix and found.startswith(key)):
+                break
+
+            yield to_text(found), struct.unpack_from('<%dI' % count, self._map,
+                self._postings + position * _POSTING.size)
+            i += 1
+
+    def items(self):
+        """Yields every (key, doc ids) pair in the segment, in key order."""
+        return self.lookup('', prefix=True)
+
+
+class SymbolIndex(object):
+    """
+    A persistent inverted index from the classes, methods and fields that
+    classes refer to, to the JARs and entries of those classes.
+
+    The index lives in the directory `path` as a set of memory-mapped
+    segments, and a manifest recording which segment holds each JAR. When
+    JARs change, `update()` indexes just those into a new segment that
+    shadows their old postings, and segments are merged by `compact()`.
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r') as fin:
+                self._manifest = json.load(fin)
+        else:
+            self._manifest = {'next': 0, 'segments': [], 'jars': {}}
+
+        self._segments = {}
+
+    def close(self):
+        """Unmaps every open segment."""
+        for segment in itervalues(self._segments):
+            segment.close()
+        self._segments.clear()
+
+    def _segment(self, name):
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = _Segment(os.path.join(self.path, name))
+            self._segments[name] = segment
+        return segment
+
+    def _save_manifest(self):
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w') as fout:
+            json.dump(self._manifest, fout)
+        replace_file(tmp, self._manifest_path)
+
+    def _new_segment_name(self):
+        name = 'seg-%06d.idx' % self._manifest['next']
+        self._manifest['next'] += 1
+        return name
+
+    def _drop_unused(self):
+        """Deletes segments that no JAR points to anymore."""
+        live = set(j['segment'] for j in itervalues(self._manifest['jars']))
+        for name in list(self._manifest['segments']):
+            if name in live:
+                continue
+            self._manifest['segments'].remove(name)
+            segment = self._segments.pop(name, None)
+            if segment is not None:
+                segment.close()
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _stamp(jar):
+        st = os.stat(jar)
+        return st.st_size, int(st.st_mtime)
+
+    def stale(self, paths):
+        """Returns those of the JARs at `paths` not indexed as they are now."""
+        jars = self._manifest['jars']
+        stale = []
+        for jar in paths:
+            known = jars.get(jar)
+            if known is None or tuple(known['stamp']) != self._stamp(jar):
+                stale.append(jar)
+        return stale
+
+    def update(self, paths, workers=None, cache=None):
+        """
+        Indexes every JAR in `paths` that is new or has changed since it
+        was last indexed, parsing with `workers` processes and an optional
+        ParseCache. Returns the list of JARs that were (re)indexed.
+        """
+        stale = self.stale(paths)
+        if not stale:
+            return []
+
+        docs = []
+        doc_ids = {}
+        postings = {}
+        for summary in scan_jars(stale, workers=workers, cache=cache):
+            doc = (summary.source, summary.filename)
+            doc_id = doc_ids.get(doc)
+            if doc_id is None:
+                doc_id = doc_ids[doc] = len(docs)
+                docs.append(doc)
+
+            for key in set(_summary_keys(summary)):
+                postings.setdefault(key, []).append(doc_id)
+
+        for ids in itervalues(postings):
+            ids.sort()
+
+        name = self._new_segment_name()
+        _write_segment(os.path.join(self.path, name), docs, postings)
+        self._manifest['segments'].append(name)
+        for jar in stale:
+            self._manifest['jars'][jar] = {
+                'stamp': self._stamp(jar),
+                'segment': name
+            }
+
+        self._drop_unused()
+        self._save_manifest()
+
+        if len(self._manifest['segments']) > _MAX_SEGMENTS:
+            self.compact()
+
+        return stale
+
+    def remove(self, paths):
+        """Drops the JARs at `paths` from the index."""
+        for jar in paths:
+            self._manifest['jars'].pop(jar, None)
+        self._drop_unused()
+        self._save_manifest()
+
+    def compact(self):
+        """Merges every segment into one, without parsing anything again."""
+        jars = self._manifest['jars']
+        docs = []
+        doc_ids = {}
+        postings = {}
+
+        for name in self._manifest['segments']:
+            segment = self._segment(name)
+            remap = {}
+            for key, ids in segment.items():
+                merged = postings.setdefault(key, [])
+                for doc_id in ids:
+                    new_id = remap.get(doc_id)
+                    if new_id is None:
+                        doc = segment.doc(doc_id)
+                        if jars.get(doc[0], {}).get('segment') != name:
+                            # Shadowed by a newer segment.
+                            new_id = remap[doc_id] = -1
+                        else:
+                            new_id = doc_ids.get(doc)
+                            if new_id is None:
+                                new_id = doc_ids[doc] = len(docs)
+                                docs.append(doc)
+                            remap[doc_id] = new_id
+                    if new_id != -1:
+                        merged.append(new_id)
+
+        for key in list(postings):
+            if postings[key]:
+                postings[key].sort()
+            else:
+                del postings[key]
+
+        name = self._new_segment_name()
+        _write_segment(os.path.join(self.path, name), docs, postings)
+        self._manifest['segments'].append(name)
+        for jar in itervalues(jars):
+            jar['segment'] = name
+
+        self._drop_unused()
+        self._save_manifest()
+
+    def query(self, key, prefix=False):
+        """
+        Returns a sorted list of (jar, entry) tuples for every class that
+        refers to `key` (see `symbol_key()`), or to any key starting with
+        it if `prefix` is `True`.
+        """
+        jars = self._manifest['jars']
+        found = set()
+        for name in self._manifest['segments']:
+            segment = self._segment(name)
+            for _, ids in segment.lookup(key, prefix):
+                for doc_id in ids:
+                    doc = segment.doc(doc_id)
+                    if jars.get(doc[0], {}).get('segment') == name:
+                        found.add(doc)
+        return sorted(found)
+
+    def who_references_class(self, class_name):
+        """Returns the classes referring to the class `class_name`."""
+        return self.query(symbol_key('c', class_name))
+
+    def who_calls(self, class_name, name):
+        """Returns the classes referring to the method `class_name.name`."""
+        return self.query(symbol_key('m', class_name, name))
+
+    def who_accesses(self, class_name, name):
+        """Returns the classes referring to the field `class_name.name`."""
+        return self.query(symbol_key('f', class_name, name))
+
+    @property
+    def jars(self):
+        """Returns a list of the JARs in the index."""
+        return sorted(self._manifest['jars'])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Opt-in counters and timers for the load pipeline. Nothing is recorded
+unless a Recorder is installed, either for a block::
+
+    with solum.instrument.recording() as rec:
+        jar = JarFile(path)
+        ...
+    print(rec.report())
+
+or for good with `install()`, optionally passing every event on to a
+callback for a metrics system. While none is installed, instrumented code
+only pays for checking `active()` once per call.
+
+Counters and timers are named by phase:
+
+- `jar.open`, `jar.central_directory`, `jar.read` (timers) and
+  `jar.entries_read`, `jar.bytes_read` for loading a JarFile.
+- `zip.inflate` (timer), `zip.entries_inflated` and `zip.bytes_inflated`.
+- `class.load` (timer) and `class.bytes` for parsing a ClassFile.
+- `pool.read` (timer), `pool.entries`, and `pool.decoded.<TAG>` for every
+  constant built, by tag.
+- `descriptor.hits` and `descriptor.misses` of the shared DescriptorCache
+  over a `recording()` block.
+
+Only the current process is recorded, not the workers of `scan_jars()`.
+"""
+__all__ = ['Recorder', 'active', 'install', 'recording']
+
+import threading
+from contextlib import contextmanager
+
+from .descriptor import shared_cache
+from .util.compat import iteritems
+
+_recorder = None
+
+
+class Recorder(object):
+    """
+    Collects counters and timers. If given, `callback` is also called as
+    `callback(kind, name, value)` for each one as it happens, where kind
+    is 'count' (value being the increment) or 'time' (in seconds).
+    """
+    def __init__(self, callback=None):
+        self.counters = {}
+        self.timers = {}
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        """Adds `n` to the counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        if self._callback is not None:
+            self._callback('count', name, n)
+
+    def add_time(self, name, seconds):
+        """Records one call of the timer `name` that took `seconds`."""
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+        if self._callback is not None:
+            self._callback('time', name, seconds)
+
+    def report(self):
+        """
+        Returns a dict of `counters`, and of `timers` each with the number
+        of `calls` and their total `seconds`.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': dict(
+                    (name, {'calls': calls, 'seconds': seconds})
+                    for name, (calls, seconds) in iteritems(self.timers)
+                )
+            }
+
+
+def active():
+    """Returns the installed Recorder, or `None` if there isn't one."""
+    return _recorder
+
+
+def install(recorder):
+    """
+    Installs `recorder` (or `None` to stop recording), returning whatever
+    was installed before.
+    """
+    global _recorder
+    previous, _recorder = _recorder, recorder
+    return previous
+
+
+@contextmanager
+def recording(callback=None):
+    """
+    Installs a new Recorder for the duration of the block, and returns
+    it. See Recorder for `callback`.
+    """
+    recorder = Recorder(callback)
+    hits, misses = shared_cache.hits, shared_cache.misses
+    previous = install(recorder)
+    try:
+        yield recorder
+    finally:
+        install(previous)
+        recorder.count('descriptor.hits', shared_cache.hits - hits)
+        recorder.count('descriptor.misses', shared_cache.misses - misses)
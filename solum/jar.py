@@ -1,15 +1,38 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
-__all__ = ['JarFile', 'JarError']
+__all__ = ['JarFile', 'JarStream', 'JarError']
 
+import os
+import zlib
 import zipfile
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
+import threading
+import functools
+from timeit import default_timer
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
+from . import instrument
 from .manifest import ManifestFile
-from .core import ClassFile
+from .core import ClassFile, ClassError
+from .util import (
+    ZipStreamWriter,
+    ZipStreamReader,
+    read_raw,
+    compress,
+    compress_chunks
+)
+from .cache import cache_key, content_key
+from .util.compat import BytesIO, basestring, iterkeys, itervalues
+
+
+# Compression methods we can inflate without going through ZipFile.
+_RAW_TYPES = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+# How many blocking reads the async API runs at once by default, across
+# every JAR. See `JarFile.aopen()`.
+ASYNC_WORKERS = 4
+_executor = None
+_executor_lock = threading.Lock()
 
 
 class JarError(Exception):
@@ -17,28 +40,207 @@ class JarError(Exception):
         Exception.__init__(self, msg)
 
 
+def _class_filename(filename):
+    """
+    Returns the entry name for the class `filename`, which may be a
+    dotted class name missing the .class suffix.
+    """
+    if not filename.endswith('.class'):
+        filename = filename.replace('.', '/')
+        filename = '%s.class' % filename
+    return filename
+
+
+def _inflate(zi, data):
+    """
+    Returns the inflated contents of the entry `zi`, given its compressed
+    `data`.
+    """
+    rec = instrument.active()
+    if rec is not None:
+        started = default_timer()
+
+    if zi.compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+
+    if zlib.crc32(data) & 0xffffffff != zi.CRC:
+        raise JarError('bad CRC for %s' % zi.filename)
+
+    if rec is not None:
+        rec.add_time('zip.inflate', default_timer() - started)
+        rec.count('zip.entries_inflated')
+        rec.count('zip.bytes_inflated', len(data))
+    return data
+
+
+def _default_executor():
+    """
+    Returns the thread pool shared by every async call not given an
+    executor of its own, creating it the first time.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(ASYNC_WORKERS)
+        return _executor
+
+
+class _AsyncClasses(object):
+    """
+    The asynchronous iterator returned by `JarFile.aiter_classes()`. Each
+    step awaits a future from the executor, so the event loop runs
+    between classes, and up to `prefetch` classes are read ahead.
+    """
+    def __init__(self, jar, names, executor, prefetch):
+        self._jar = jar
+        self._names = deque(names)
+        self._executor = executor
+        self._prefetch = max(1, prefetch)
+        self._pending = deque()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        while self._names and len(self._pending) < self._prefetch:
+            self._pending.append(loop.run_in_executor(self._executor,
+                self._jar.open_class, self._names.popleft()))
+
+        if self._pending:
+            return self._pending.popleft()
+
+        done = loop.create_future()
+        done.set_exception(StopAsyncIteration())
+        return done
+
+
 class JarFile(object):
-    def __init__(self, source=None):
+    def __init__(self, source=None, lazy=False, descriptor_cache=None,
+            parse_cache=None):
+        """
+        Opens the JAR `source`, which may be a path or a file-like object.
+        Classes opened from it parse their descriptors through
+        `descriptor_cache`, or the shared DescriptorCache if none is given.
+        `parse_cache` is an optional ParseCache used by
+        `summarize_class()`.
+
+        By default every entry is read into memory up front, still
+        compressed, and inflated the first time it is asked for, after
+        which the inflated contents are kept as well. If `lazy` is `True`,
+        only the central directory is read, entries are inflated each time
+        they are asked for, and the source is kept open until `close()` is
+        called. Either way, entries that are never modified are never
+        inflated by `save()`.
+        """
+        # Entries written since loading, by name.
         self._files = {}
+        # Untouched entries from the source, by name, and their compressed
+        # data if the source has already been read.
+        self._entries = {}
+        self._raw = {}
+        # Inflated contents of untouched entries read so far, when the
+        # source has already been read.
+        self._inflated = {}
+        # Timestamps of source entries that have since been written, so
+        # they can be kept when saving.
+        self._dates = {}
+        self._source = None
+        self._descriptor_cache = descriptor_cache
+        self._parse_cache = parse_cache
+        self._path = source if isinstance(source, basestring) else None
         self._cache_class_count = None
 
+        rec = instrument.active()
+        if rec is not None:
+            started = default_timer()
+
         if source and zipfile.is_zipfile(source):
             source_ = zipfile.ZipFile(source, 'r')
+            if rec is not None:
+                read_started = default_timer()
+                rec.add_time('jar.central_directory',
+                    read_started - started)
+
             # TODO: Can we creatively patch ZipFile to allow us to
             # safely pass ZipInfo on Python < 2.6?
             for zi in source_.infolist():
-                self._files[zi.filename] = source_.read(zi.filename)
-            source_.close()
+                if lazy:
+                    self._entries[zi.filename] = zi
+                elif zi.compress_type in _RAW_TYPES:
+                    self._entries[zi.filename] = zi
+                    self._raw[zi.filename] = read_raw(source_, zi)
+                else:
+                    # Compressed in a way we can't inflate ourselves.
+                    self._files[zi.filename] = source_.read(zi.filename)
+                    self._dates[zi.filename] = zi.date_time
+
+            if rec is not None and not lazy:
+                rec.add_time('jar.read', default_timer() - read_started)
+                rec.count('jar.entries_read', len(self._entries) +
+                    len(self._files))
+                rec.count('jar.bytes_read', sum(
+                    len(data) for data in itervalues(self._raw)))
+
+            if lazy:
+                self._source = source_
+            else:
+                source_.close()
         elif source:
             raise JarError('source is not a valid zip file')
 
-        self._manifest = ManifestFile(
-            self._files.pop('META-INF/MANIFEST.MF', None)
-        )
+        manifest = self.read('META-INF/MANIFEST.MF')
+        self._files.pop('META-INF/MANIFEST.MF', None)
+        self._raw.pop('META-INF/MANIFEST.MF', None)
+        self._inflated.pop('META-INF/MANIFEST.MF', None)
+        zi = self._entries.pop('META-INF/MANIFEST.MF', None)
+        if zi is not None:
+            self._dates['META-INF/MANIFEST.MF'] = zi.date_time
+
+        self._manifest = ManifestFile(manifest)
+
+        if rec is not None:
+            rec.add_time('jar.open', default_timer() - started)
+
+    def close(self):
+        """
+        Closes the source archive of a lazy JAR. Entries that have not
+        been read or written are no longer available afterwards.
+        """
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+            self._entries.clear()
+            self._cache_class_count = None
+
+    @property
+    def is_lazy(self):
+        """Returns `True` if entries are being inflated on demand."""
+        return self._source is not None
 
     def read(self, filename):
         """Returns the contents of the file `filename`."""
-        return self._files.get(filename)
+        contents = self._files.get(filename)
+        if contents is None and filename in self._entries:
+            zi = self._entries[filename]
+            if self._source is not None:
+                rec = instrument.active()
+                if rec is not None:
+                    started = default_timer()
+                contents = self._source.read(zi)
+                if rec is not None:
+                    rec.add_time('zip.inflate', default_timer() - started)
+                    rec.count('zip.entries_inflated')
+                    rec.count('zip.bytes_inflated', len(contents))
+            else:
+                contents = self._inflated.get(filename)
+                if contents is None:
+                    contents = _inflate(zi, self._raw[filename])
+                    self._inflated[filename] = contents
+        return contents
 
     def open(self, filename):
         """
@@ -48,25 +250,182 @@ class JarFile(object):
         contents = self.read(filename)
         if not contents:
             raise JarError('file does not exist')
-        return StringIO(contents)
+        return BytesIO(contents)
 
     def open_class(self, filename):
         """
         Opens and returns a ClassFile object for the given `filename`.
         If the filename is missing the .class suffix, it will be added.
         """
-        if not filename.endswith('.class'):
-            filename = filename.replace('.', '/')
-            filename = '%s.class' % filename
+        filename = _class_filename(filename)
+
+        contents = self.read(filename)
+        if not contents:
+            raise JarError('file does not exist')
+        return ClassFile.from_buffer(contents,
+            descriptor_cache=self._descriptor_cache)
 
-        return ClassFile(self.open(filename))
+    def cache_key(self, filename):
+        """
+        Returns the ParseCache key for the file `filename`. For entries
+        that haven't been modified this comes straight from the central
+        directory, without inflating anything.
+        """
+        zi = self._entries.get(filename)
+        if zi is not None:
+            return cache_key(zi.CRC, zi.file_size)
+
+        contents = self._files.get(filename)
+        if contents is None:
+            raise JarError('file does not exist')
+        return content_key(contents)
+
+    def summarize_class(self, filename):
+        """
+        Returns a ClassSummary of the class `filename`. If the JAR has a
+        `parse_cache`, it is checked first, so a class that has been seen
+        before (anywhere) is neither inflated nor parsed again.
+        """
+        from .scan import summarize
+
+        filename = _class_filename(filename)
+        cache = self._parse_cache
+        if cache is not None:
+            key = self.cache_key(filename)
+            summary = cache.get(key)
+            if summary is not None:
+                return summary._replace(source=self._path, filename=filename)
+
+        contents = self.read(filename)
+        if not contents:
+            raise JarError('file does not exist')
+
+        summary = summarize(self._path, filename, contents)
+        if cache is not None:
+            cache.put(key, summary)
+        return summary
+
+    def _read_prefix(self, filename, size):
+        """
+        Returns at most the first `size` bytes of `filename`, inflating no
+        more of it than needed.
+        """
+        contents = self._files.get(filename)
+        if contents is None:
+            contents = self._inflated.get(filename)
+        if contents is not None:
+            return contents[:size]
+
+        zi = self._entries[filename]
+        if self._source is not None:
+            with self._source.open(zi) as fin:
+                return fin.read(size)
+
+        data = self._raw[filename]
+        if zi.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompressobj(-15).decompress(data, size)
+        return data[:size]
+
+    def peek_class(self, filename, name=True):
+        """
+        Returns a ClassHeader with the version and, if `name` is `True`,
+        the name of the class `filename`, as ClassFile.peek() does. Only
+        the start of the entry is inflated, growing from a few KB until
+        the constant pool has been skipped.
+        """
+        filename = _class_filename(filename)
+        if filename not in self._files and filename not in self._entries:
+            raise JarError('file does not exist')
+
+        size = 4096 if name else 8
+        while True:
+            data = self._read_prefix(filename, size)
+            try:
+                return ClassFile.peek(memoryview(data), name=name)
+            except ClassError:
+                if len(data) < size:
+                    raise
+            size *= 4
+
+    @classmethod
+    def aopen(cls, source, executor=None, **kwargs):
+        """
+        Opens a JarFile without blocking the event loop, for use as
+        `jar = await JarFile.aopen(path)`. The JAR is read in `executor`,
+        or a pool shared by every async call that runs at most
+        `ASYNC_WORKERS` reads at once. Other arguments are passed on to
+        JarFile(). Like the rest of the async API, this needs Python 3.5
+        or later.
+        """
+        import asyncio
+
+        return asyncio.get_event_loop().run_in_executor(
+            executor or _default_executor(),
+            functools.partial(cls, source, **kwargs)
+        )
+
+    def aiter_classes(self, executor=None, prefetch=2):
+        """
+        Returns an asynchronous iterator over every class in the JAR, as
+        ClassFile objects in name order, for use as
+        `async for cf in jar.aiter_classes()`. Each class is inflated and
+        parsed in `executor` (see `aopen()`), with up to `prefetch` in
+        flight at a time. Needs Python 3.5 or later.
+        """
+        names = sorted(n for n in self.namelist() if n.endswith('.class'))
+        return _AsyncClasses(self, names, executor or _default_executor(),
+            prefetch)
+
+    def diff(self, other, workers=None, chunk_size=64):
+        """
+        Yields a DiffRecord for every entry that differs between this JAR
+        and `other`, a JarFile or path. See `solum.diff()`.
+        """
+        from .jardiff import diff
+
+        return diff(self, other, workers=workers, chunk_size=chunk_size)
+
+    def namelist(self):
+        """Returns the names of every file in the JAR except the manifest."""
+        return list(self._files) + list(self._entries)
+
+    def iter_classes(self, workers=None, chunk_size=64):
+        """
+        Yields a `ClassSummary` for every class in the JAR, parsing them
+        across `workers` processes in batches of `chunk_size` entries.
+        Summaries are yielded as each batch finishes, not in JAR order.
+        """
+        from .scan import iter_summaries, _batches, _serial
+
+        names = [n for n in self.namelist() if n.endswith('.class')]
+        if self._path is not None and not self._files:
+            # Run here, tasks can read from this JarFile, and workers can
+            # re-open the JAR themselves, so either way only send names.
+            source = self if _serial(workers) else self._path
+            tasks = ((source, b) for b in _batches(names, chunk_size))
+        else:
+            tasks = (
+                (None, [(n, self.read(n)) for n in b])
+                for b in _batches(names, chunk_size)
+            )
+
+        return iter_summaries(tasks, workers=workers)
 
     def write(self, filename, contents):
         """
-        Creates or overwrites `filename` with `contents`. This has
-        no effect on-disk until `save()` is called.
+        Creates or overwrites `filename` with `contents`, which may also
+        be a ClassFile. This has no effect on-disk until `save()` is
+        called.
         """
+        if isinstance(contents, ClassFile):
+            contents = contents.to_bytes()
+
         self._cache_class_count = None
+        zi = self._entries.pop(filename, None)
+        if zi is not None:
+            self._dates[filename] = zi.date_time
+        self._raw.pop(filename, None)
+        self._inflated.pop(filename, None)
         self._files[filename] = contents
 
     def remove(self, filename):
@@ -77,6 +436,13 @@ class JarFile(object):
         if filename in self._files:
             self._cache_class_count = None
             del self._files[filename]
+            self._dates.pop(filename, None)
+            return True
+        elif filename in self._entries:
+            self._cache_class_count = None
+            del self._entries[filename]
+            self._raw.pop(filename, None)
+            self._inflated.pop(filename, None)
             return True
         return False
 
@@ -87,36 +453,132 @@ class JarFile(object):
             return self._cache_class_count
 
         tally = 0
-        for file_ in self._files.iterkeys():
+        for file_ in iterkeys(self._files):
+            if file_.endswith('.class'):
+                tally += 1
+        for file_ in iterkeys(self._entries):
             if file_.endswith('.class'):
                 tally += 1
 
         self._cache_class_count = tally
         return tally
 
-    def save(self, output):
+    def save(self, output, workers=None, level=zlib.Z_DEFAULT_COMPRESSION,
+            date_time=None):
         """
-        Saves the JAR into the file at `output`, which will be overwritten
-        if it exists.
+        Saves the JAR into `output`, which may be a path (overwritten if
+        it exists) or any object with a `write()` method. The archive is
+        written as a stream, and entries that were never modified are
+        copied across still compressed.
+
+        Modified entries are deflated at zlib `level`, across a pool of
+        `workers` threads if given. They keep the timestamp of the entry
+        they replaced, and new entries are stamped 1980-01-01 00:00:00,
+        unless `date_time` (a 6-tuple as used by ZipInfo) is given, such
+        as `time.localtime()[:6]` for the current time. Entries are always
+        written in the same order, so by default the output is
+        byte-for-byte reproducible.
 
         WARNING: This is far from perfect, and information may be lost. It
         is advised to keep a copy of any source JAR.
         """
-        if not self._files:
+        if not self._files and not self._entries:
             # Trying to write empty ZIPs with ZipFile will produce
             # invalid archives (missing central directory).
             raise JarError('cannot save an empty JAR')
 
-        out = zipfile.ZipFile(output, 'w')
+        if isinstance(output, basestring):
+            if (self._source is not None and self._path is not None and
+                    os.path.exists(output) and
+                    os.path.samefile(output, self._path)):
+                raise JarError('cannot save a lazy JAR over its source')
+
+            with open(output, 'wb') as fout:
+                self._save_to(fout, workers, level, date_time)
+        else:
+            self._save_to(output, workers, level, date_time)
+
+    def _save_to(self, fout, workers, level, date_time):
+        out = ZipStreamWriter(fout)
 
         # Make sure the manifest (if it exists) is the first record
-        # in the JAR for legacy reasons.
-        out.writestr('META-INF/MANIFEST.MF', self.manifest.build())
-        for filename, filedata in self._files.iteritems():
-            out.writestr(filename, filedata)
+        # in the JAR for legacy reasons. It is compressed as it is built,
+        # as manifests of signed JARs can be large.
+        crc, size, data = compress_chunks(self.manifest.iter_build(),
+            level=level)
+        out.write_compressed('META-INF/MANIFEST.MF', crc, size, data,
+            date_time=date_time or self._dates.get('META-INF/MANIFEST.MF'))
+
+        # Untouched entries keep their order from the source archive.
+        entries = sorted(
+            itervalues(self._entries),
+            key=lambda zi: zi.header_offset
+        )
+        for zi in entries:
+            data = self._raw.get(zi.filename)
+            if data is None:
+                data = read_raw(self._source, zi)
+            out.write_raw(zi, data)
+
+        names = sorted(self._files)
+
+        def compress_(filename):
+            return compress(self._files[filename], level=level)
+
+        pool = None
+        if workers and workers > 1 and len(names) > 1:
+            pool = ThreadPool(workers)
+            # imap hands results back in order, so the output doesn't
+            # depend on which thread finishes first.
+            compressed = pool.imap(compress_, names)
+        else:
+            compressed = (compress_(n) for n in names)
+
+        try:
+            for filename, (crc, data) in zip(names, compressed):
+                out.write_compressed(filename, crc,
+                    len(self._files[filename]), data,
+                    date_time=date_time or self._dates.get(filename))
+        finally:
+            if pool is not None:
+                pool.terminate()
+
         out.close()
 
     @property
     def manifest(self):
         """Returns the underlying JAR MANIFEST.MF."""
         return self._manifest
+
+
+class JarStream(object):
+    """
+    Reads a JAR front to back from `source`, any object with a `read()`
+    method, such as an HTTP response or a member of a tar file. Nothing
+    is buffered beyond the entry being read and no temporary file is
+    used, but entries can only be seen once, in archive order.
+
+    Iterating yields a tuple of (filename, contents) for every entry but
+    the manifest, where contents is a ClassFile for classes if
+    `parse_classes` is `True` and the raw bytes otherwise. The manifest
+    is parsed into `manifest` when it is reached, which in a well-formed
+    JAR is before anything else.
+    """
+    def __init__(self, source, parse_classes=True, descriptor_cache=None):
+        self._reader = ZipStreamReader(source)
+        self._parse_classes = parse_classes
+        self._descriptor_cache = descriptor_cache
+        self.manifest = ManifestFile()
+
+    def __iter__(self):
+        for zi, contents in self._reader:
+            filename = zi.filename
+            if filename == 'META-INF/MANIFEST.MF':
+                self.manifest = ManifestFile(contents)
+                continue
+
+            if self._parse_classes and filename.endswith('.class'):
+                contents = ClassFile.from_buffer(contents,
+                    descriptor_cache=self._descriptor_cache)
+
+            yield filename, contents
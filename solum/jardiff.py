@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['DiffRecord', 'diff', 'write_report']
+
+import json
+import multiprocessing
+from collections import namedtuple
+
+from .jar import JarFile
+from .core import ClassFile, ConstantType
+from .scan import _batches, _serial, _init_worker, _open_jar
+from .descriptor import to_field_descriptor, to_method_descriptor
+from .util.compat import iteritems
+
+# `status` is one of 'added', 'removed' or 'changed', and `details` a dict
+# describing the change (see `diff()`).
+DiffRecord = namedtuple('DiffRecord', 'filename status details')
+
+_MANIFEST = 'META-INF/MANIFEST.MF'
+
+
+def _refs(cf):
+    """
+    Returns the set of classes, fields and methods referred to by the
+    ClassFile `cf`, as tuples of (kind, class name[, name, descriptor]).
+    """
+    refs = set()
+    for constant in cf.constants.find():
+        tag = constant.tag
+        if tag == ConstantType.CLASS:
+            refs.add(('class', constant.name))
+        elif tag == ConstantType.FIELD:
+            refs.add(('field', constant.class_name, constant.name,
+                to_field_descriptor(constant.of_type)))
+        elif tag in (ConstantType.METHOD, ConstantType.INTERFACE):
+            refs.add(('method', constant.class_name, constant.name,
+                to_method_descriptor(constant.takes, constant.returns)))
+    return refs
+
+
+def _compare(filename, old, new):
+    """Returns the DiffRecord for an entry whose contents changed."""
+    details = {'size': (len(old), len(new))}
+    if not filename.endswith('.class'):
+        return DiffRecord(filename, 'changed', details)
+
+    a = ClassFile.from_buffer(old)
+    b = ClassFile.from_buffer(new)
+    if a.version != b.version:
+        details['version'] = (a.version, b.version)
+
+    refs_a = _refs(a)
+    refs_b = _refs(b)
+    details['added_refs'] = sorted(refs_b - refs_a)
+    details['removed_refs'] = sorted(refs_a - refs_b)
+    return DiffRecord(filename, 'changed', details)
+
+
+def _diff_task(task):
+    """
+    Compares one batch of entries. A task is the old and new source, each
+    either a JarFile or path (see `scan._open_jar()`) or a dict of the
+    batch's contents by name, and the names in the batch.
+    """
+    old, new, names = task
+    jars = []
+    try:
+        if not isinstance(old, dict):
+            old, owned = _open_jar(old)
+            if owned:
+                jars.append(old)
+        if not isinstance(new, dict):
+            new, owned = _open_jar(new)
+            if owned:
+                jars.append(new)
+
+        read_old = old.get if isinstance(old, dict) else old.read
+        read_new = new.get if isinstance(new, dict) else new.read
+        return [_compare(n, read_old(n), read_new(n)) for n in names]
+    finally:
+        for jar in jars:
+            jar.close()
+
+
+def _iter_tasks(tasks, workers):
+    if _serial(workers):
+        for task in tasks:
+            for record in _diff_task(task):
+                yield record
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        # imap keeps the report in the same order however it's run.
+        for records in pool.imap(_diff_task, tasks):
+            for record in records:
+                yield record
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _source(jar, names):
+    """
+    Returns what a worker needs to read `names` from `jar`: its path if
+    it is unmodified on disk, or else the contents themselves.
+    """
+    if jar._path is not None and not jar._files:
+        return jar._path
+    return dict((n, jar.read(n)) for n in names)
+
+
+def _diff_manifests(old, new):
+    details = {}
+
+    headers_a, headers_b = old.headers, new.headers
+    headers = dict(
+        (k, (headers_a.get(k), headers_b.get(k)))
+        for k in set(headers_a) | set(headers_b)
+        if headers_a.get(k) != headers_b.get(k)
+    )
+    if headers:
+        details['headers'] = headers
+
+    # Attribute order doesn't matter.
+    packages_a = dict((k, dict(v)) for k, v in iteritems(old.packages))
+    packages_b = dict((k, dict(v)) for k, v in iteritems(new.packages))
+    packages = dict(
+        (k, (packages_a.get(k), packages_b.get(k)))
+        for k in set(packages_a) | set(packages_b)
+        if packages_a.get(k) != packages_b.get(k)
+    )
+    if packages:
+        details['packages'] = packages
+
+    return details
+
+
+def diff(old, new, workers=None, chunk_size=64):
+    """
+    Compares the JARs `old` and `new` (JarFile objects or paths), and
+    yields a DiffRecord for every entry that differs. The report is
+    streamed: records for the manifest, removed and added entries come
+    first, then changed entries in name order as they are compared.
+
+    Entries with the same CRC and size in both JARs are taken to be the
+    same without being inflated. Changed entries are compared in batches
+    of `chunk_size` across `workers` processes, which re-open JARs on
+    disk rather than being sent their contents. For changed classes,
+    `details` holds their `size` and, if it changed, their `version`,
+    as (old, new) tuples, and the `added_refs` and `removed_refs` to
+    classes, fields and methods in their constant pools. For the
+    manifest, it holds the `headers` and `packages` that differ.
+    """
+    opened = []
+    if not isinstance(old, JarFile):
+        old = JarFile(old, lazy=True)
+        opened.append(old)
+    if not isinstance(new, JarFile):
+        new = JarFile(new, lazy=True)
+        opened.append(new)
+
+    try:
+        for record in _diff_jars(old, new, workers, chunk_size):
+            yield record
+    finally:
+        for jar in opened:
+            jar.close()
+
+
+def _diff_jars(old, new, workers, chunk_size):
+    manifest = _diff_manifests(old.manifest, new.manifest)
+    if manifest:
+        yield DiffRecord(_MANIFEST, 'changed', manifest)
+
+    names_a = set(old.namelist())
+    names_b = set(new.namelist())
+    for name in sorted(names_a - names_b):
+        yield DiffRecord(name, 'removed', {})
+    for name in sorted(names_b - names_a):
+        yield DiffRecord(name, 'added', {})
+
+    changed = [
+        name for name in sorted(names_a & names_b)
+        if old.cache_key(name) != new.cache_key(name)
+    ]
+
+    if _serial(workers):
+        # Compared in this process, batches can read the open JARs.
+        tasks = (
+            (old, new, batch) for batch in _batches(changed, chunk_size)
+        )
+    else:
+        tasks = (
+            (_source(old, batch), _source(new, batch), batch)
+            for batch in _batches(changed, chunk_size)
+        )
+    for record in _iter_tasks(tasks, workers):
+        yield record
+
+
+def write_report(records, fout):
+    """
+    Writes `records` from `diff()` to the file-like object `fout` as JSON,
+    one record per line, as they come.
+    """
+    for record in records:
+        fout.write(json.dumps(record._asdict(), sort_keys=True))
+        fout.write('\n')
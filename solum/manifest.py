@@ -2,10 +2,13 @@
 # -*- coding: utf8 -*-
 __all__ = ['ManifestFile', 'ManifestError']
 
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
+from collections import OrderedDict
+
+from .util.compat import PY3, basestring, iteritems, to_text
+
+# No line may be longer than this many bytes, not counting the newline.
+# Longer values continue on lines starting with a single space.
+_LINE_LIMIT = 72
 
 
 class ManifestError(Exception):
@@ -13,8 +16,85 @@ class ManifestError(Exception):
         Exception.__init__(self, msg)
 
 
-def _chunk_line(line, n):
-    return [line[i:i + n] for i in range(0, len(line), n)]
+def _parse_section(text):
+    """
+    Parses the lines of one manifest section (without its trailing blank
+    line) into an OrderedDict of attributes, in order.
+    """
+    attributes = OrderedDict()
+    key = None
+    for line in text.split('\n'):
+        if line[:1] == ' ':
+            # A continuation of the previous line.
+            if key is None:
+                raise ManifestError('invalid manifest continuation')
+            attributes[key] += line[1:]
+            continue
+
+        key, sep, value = line.partition(':')
+        if not sep:
+            raise ManifestError('invalid manifest line %r' % line)
+        attributes[key] = value.lstrip()
+
+    return attributes
+
+
+def _section_name(text):
+    """
+    Returns the value of the Name attribute that starts the section
+    `text`, or `None` if it doesn't start with one.
+    """
+    if not text.startswith('Name:'):
+        return None
+
+    end = text.find('\n')
+    if end == -1:
+        return text[5:].lstrip()
+    elif text[end + 1:end + 2] != ' ':
+        return text[5:end].lstrip()
+
+    # The name is long enough to have been split over several lines.
+    return _parse_section(text)['Name']
+
+
+if PY3:
+    def _encode(text):
+        return text.encode('utf-8')
+else:
+    def _encode(text):
+        return text
+
+
+def _wrap(line):
+    """
+    Returns `line` and its newline encoded, split into lines short enough
+    without splitting any UTF-8 sequence.
+    """
+    line = _encode(line)
+    if len(line) <= _LINE_LIMIT:
+        return line + b'\n'
+
+    data = bytearray(line)
+    parts = []
+    start = 0
+    limit = _LINE_LIMIT
+    while len(line) - start > limit:
+        end = start + limit
+        while end > start + 1 and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(line[start:end])
+        start = end
+        limit = _LINE_LIMIT - 1
+    parts.append(line[start:])
+    return b'\n '.join(parts) + b'\n'
+
+
+def _build_section(attributes, skip):
+    return b''.join(
+        _wrap('%s: %s' % (k, v))
+        for k, v in iteritems(attributes)
+        if v is not None and k != skip
+    )
 
 
 class ManifestFile(object):
@@ -22,58 +102,68 @@ class ManifestFile(object):
     def __init__(self, source=None):
         """
         Creates a new manifest file, optionally populating it from
-        the string or file-like object `source`.
+        the bytes or file-like object `source`. Its contents are decoded
+        as UTF-8 on Python 3, where attributes are str.
+
+        Only the main section is parsed up front. Every other section is
+        kept as text, keyed by its name, until it is asked for, and
+        written back out as is unless it was replaced.
         """
+        # Sections by name, each either its text as read or an
+        # OrderedDict of attributes if it was added since, and their names
+        # in order.
         self._entries = {}
-        self._header = {
-            'Manifest-Version': '1.0',
-        }
+        self._names = []
+        # Sections that have been parsed from their text, by name.
+        self._parsed = {}
+        self._header = OrderedDict([
+            ('Manifest-Version', '1.0'),
+        ])
 
-        if source:
-            is_stringio = False
-            if isinstance(source, basestring):
-                source = StringIO(source)
-                is_stringio = True
-
-            is_header = True
-            current_entry = None
-            last_key = None
-            tmp_entry = {}
-
-            for line in source:
-                # Is it the end of a section?
-                if not line.strip():
-                    if is_header:
-                        is_header = False
-                        self._header.update(tmp_entry)
-                    elif not current_entry:
-                        break
-                    else:
-                        self._entries[current_entry] = tmp_entry
-
-                    tmp_entry = {}
-                    current_entry = None
+        if source and not isinstance(source, (basestring, bytes)):
+            source = source.read()
 
+        if source:
+            source = to_text(source)
+            if '\r' in source:
+                source = source.replace('\r\n', '\n').replace('\r', '\n')
+
+            sections = source.split('\n\n')
+            header = sections[0].strip('\n')
+            if header:
+                self._header.update(_parse_section(header))
+
+            entries = self._entries
+            names = self._names
+            for text in sections[1:]:
+                text = text.strip('\n')
+                if not text:
                     continue
 
-                # Is this a continuation of the previous line?
-                if line[0] == ' ':
-                    if not last_key:
-                        raise ManifestError('invalid manifest continuation')
-
-                    tmp_entry[current_entry][last_key] += line[1:]
-                else:
-                    key, value = line.strip().split(':', 1)
-                    if key == 'Name':
-                        current_entry = value.lstrip()
-                    tmp_entry[key] = value.lstrip()
-
-            if is_stringio:
-                source.close()
+                name = _section_name(text)
+                if name is None:
+                    name = _parse_section(text).get('Name')
+                    if name is None:
+                        # Sections have to be named, so this can't be one.
+                        continue
 
+                if name not in entries:
+                    names.append(name)
+                entries[name] = text
         else:
             self._header['Created-By'] = self.created_by
 
+    def _entry(self, name):
+        """Returns the attributes of the section `name`, parsing it."""
+        entry = self._entries.get(name)
+        if entry is None or not isinstance(entry, basestring):
+            return entry
+
+        parsed = self._parsed.get(name)
+        if parsed is None:
+            parsed = self._parsed[name] = _parse_section(entry)
+        return parsed
+
     @property
     def created_by(self):
         """
@@ -122,7 +212,7 @@ class ManifestFile(object):
 
     def get_entry(self, name):
         """Returns the dictionary for the entry `name`."""
-        ct = self._entries.get(name)
+        ct = self._entry(name)
         return ct.copy() if ct is not None else None
 
     def get_header(self, field):
@@ -134,60 +224,47 @@ class ManifestFile(object):
         Adds a new section to the manifest, populating it with `values`,
         which can be anything accepted to the dict() constructo.
         """
-        self._entries[name] = dict(values)
-        self._entries[name]['Name'] = name
+        entry = OrderedDict([('Name', name)])
+        entry.update(values)
+        entry['Name'] = name
+        if name not in self._entries:
+            self._names.append(name)
+        self._entries[name] = entry
+        self._parsed.pop(name, None)
 
     @property
     def packages(self):
         """Returns a (shallow) copy of all packages in the manifest."""
-        return self._entries.copy()
+        return OrderedDict(
+            (name, self._entry(name)) for name in self._names
+        )
 
     @property
     def headers(self):
         """Returns a (shallow) copy of the manifest header."""
         return self._header.copy()
 
+    def iter_build(self):
+        """
+        Yields the final, valid MANIFEST.MF file in pieces of bytes, so it
+        never has to be held in memory whole. Sections keep their order,
+        and those read from a manifest and never replaced are copied as
+        they were.
+        """
+        yield b'Manifest-Version: 1.0\n'
+        # We only output V1 manifests, so the version is always 1.0.
+        yield _build_section(self._header, 'Manifest-Version')
+        yield b'\n'
+
+        for name in self._names:
+            entry = self._entries[name]
+            if isinstance(entry, basestring):
+                yield _encode(entry + '\n\n')
+            else:
+                yield _wrap('Name: %s' % name)
+                yield _build_section(entry, 'Name')
+                yield b'\n'
+
     def build(self):
-        """Returns the final, valid MANIFEST.MF file as a string."""
-        output = []
-
-        # Build the manifest header
-        output.append('Manifest-Version: 1.0\n')
-        for k, v in self._header.iteritems():
-            # We only output V1 manifests, so ignore
-            # this if it's set.
-            if k == 'Manifest-Version':
-                continue
-            if v is None:
-                continue
-            output.append('%s: %s\n' % (k, v))
-        output.append('\n')
-
-        # Build the manifest sections
-        for package_name, package_data in self._entries.iteritems():
-            output.append('Name: %s\n' % package_name)
-            for k, v in package_data.iteritems():
-                if k == 'Name':
-                    continue
-                if v is None:
-                    continue
-                output.append('%s: %s\n' % (k, v))
-            output.append('\n')
-
-        # Chunk all the lines so none is more than
-        # 72 characters, including colon, space,
-        # and newline.
-        final = []
-        for i, line in enumerate(output):
-            if len(line) <= 72:
-                final.append(line)
-                continue
-
-            parts = _chunk_line(line, 72)
-            last_line = parts.pop()
-            final.append('%s\n' % parts.pop(0))
-            for part in parts:
-                final.append(' %s\n' % part)
-            final.append(' %s' % last_line)
-
-        return ''.join(final)
+        """Returns the final, valid MANIFEST.MF file as bytes."""
+        return b''.join(self.iter_build())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['ClassSummary', 'summarize', 'scan_jars', 'collect_stats']
+
+import multiprocessing
+from collections import namedtuple
+
+from .jar import JarFile
+from .core import ClassFile
+from .core.stats import PoolStats
+from .util.compat import xrange
+
+# The JARs a pool worker has opened, by path, so that its later batches of
+# the same JAR don't each read the whole central directory again. It is
+# only set in pool workers (see `_init_worker()`), whose JARs are closed
+# when the process exits.
+_worker_jars = None
+
+ClassSummary = namedtuple('ClassSummary',
+        'source filename name version constants super_class interfaces '
+        'fields methods')
+
+
+def summarize(source, filename, contents):
+    """
+    Parses the class `contents` found at `filename` in the JAR `source`,
+    returning a compact and picklable ClassSummary. Fields and methods
+    are kept without their attributes.
+    """
+    cf = ClassFile.from_buffer(contents)
+    return ClassSummary(
+        source,
+        filename,
+        cf.this,
+        cf.version,
+        tuple(cf.constants.find()),
+        cf.super_class,
+        tuple(cf.interfaces),
+        tuple(f._replace(attributes=()) for f in cf.fields),
+        tuple(m._replace(attributes=()) for m in cf.methods)
+    )
+
+
+def _init_worker():
+    global _worker_jars
+    _worker_jars = {}
+
+
+def _open_jar(source):
+    """
+    Returns a tuple of (JarFile, owned) for the `source` of a task, either
+    a JarFile already open in this process or the path of one. Pool
+    workers keep every JAR they open for their later tasks, so `owned` is
+    only `True` if the caller has to close the JarFile itself.
+    """
+    if isinstance(source, JarFile):
+        return source, False
+    elif _worker_jars is None:
+        return JarFile(source, lazy=True), True
+
+    jar = _worker_jars.get(source)
+    if jar is None:
+        jar = _worker_jars[source] = JarFile(source, lazy=True)
+    return jar, False
+
+
+def _scan_task(task):
+    """
+    Summarizes one batch of classes. A task is either a JarFile or path
+    (see `_open_jar()`) and a list of entry names to read from it, or
+    `None` and a list of (filename, contents) pairs.
+    """
+    source, entries = task
+    if source is None:
+        return [summarize(None, f, c) for f, c in entries]
+
+    jar, owned = _open_jar(source)
+    try:
+        return [summarize(jar._path, f, jar.read(f)) for f in entries]
+    finally:
+        if owned:
+            jar.close()
+
+
+def _batches(items, chunk_size):
+    for i in xrange(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+
+def _serial(workers):
+    """Returns `True` if tasks for `workers` are run in this process."""
+    return not workers or workers == 1
+
+
+def _imap(func, tasks, workers):
+    """
+    Yields `func(task)` for each of `tasks`, spread across a process pool
+    if there is more than one worker, in which case results come back in
+    completion order.
+    """
+    if _serial(workers):
+        for task in tasks:
+            yield func(task)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        for result in pool.imap_unordered(func, tasks):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def iter_summaries(tasks, workers=None):
+    """
+    Runs `tasks` (see `_scan_task`) and yields each ClassSummary as soon
+    as its batch is done. With more than one worker the batches are
+    spread across a process pool and come back in completion order.
+    """
+    for summaries in _imap(_scan_task, tasks, workers):
+        for summary in summaries:
+            yield summary
+
+
+def _jar_tasks(paths, chunk_size, serial=False):
+    """
+    Yields a task (see `_scan_task`) for every batch of `chunk_size`
+    classes in the JARs at `paths`, reading only their central
+    directories. If the tasks are `serial`, run in this process as they
+    are yielded, they read from the JarFile opened here rather than
+    opening it again.
+    """
+    for path in paths:
+        jar = JarFile(path, lazy=True)
+        try:
+            names = [n for n in jar.namelist() if n.endswith('.class')]
+            if serial:
+                for batch in _batches(names, chunk_size):
+                    yield jar, batch
+        finally:
+            jar.close()
+
+        if not serial:
+            for batch in _batches(names, chunk_size):
+                yield path, batch
+
+
+def scan_jars(paths, workers=None, chunk_size=64, cache=None):
+    """
+    Yields a ClassSummary for every class in the JARs at `paths`. Only
+    the central directory of each JAR is read up front; the classes
+    themselves are inflated and parsed across `workers` processes, in
+    batches of `chunk_size` entries, and yielded as they finish.
+
+    If a ParseCache is given as `cache`, classes found in it are yielded
+    first without being inflated, and everything else is parsed and
+    added to it.
+    """
+    if cache is not None:
+        return _scan_cached(paths, workers, chunk_size, cache)
+    return iter_summaries(_jar_tasks(paths, chunk_size, _serial(workers)),
+        workers=workers)
+
+
+def _scan_cached(paths, workers, chunk_size, cache):
+    keys = {}
+    tasks = []
+    # Run serially, tasks read from the JARs opened here, so they are
+    # kept open until then.
+    serial = _serial(workers)
+    jars = []
+    try:
+        for path in paths:
+            jar = JarFile(path, lazy=True)
+            jars.append(jar)
+            misses = []
+            for name in jar.namelist():
+                if not name.endswith('.class'):
+                    continue
+
+                key = jar.cache_key(name)
+                summary = cache.get(key)
+                if summary is not None:
+                    yield summary._replace(source=path, filename=name)
+                else:
+                    keys[path, name] = key
+                    misses.append(name)
+
+            source = jar if serial else path
+            tasks.extend((source, b) for b in _batches(misses, chunk_size))
+            if not serial:
+                jar.close()
+
+        for summary in iter_summaries(tasks, workers=workers):
+            cache.put(keys[summary.source, summary.filename], summary)
+            yield summary
+    finally:
+        for jar in jars:
+            jar.close()
+
+    cache.flush()
+
+
+def _stats_task(task):
+    """Returns a PoolStats of one batch of classes from a JAR."""
+    source, entries = task
+    stats = PoolStats()
+    jar, owned = _open_jar(source)
+    try:
+        for filename in entries:
+            stats.add_class(ClassFile.from_buffer(jar.read(filename)))
+    finally:
+        if owned:
+            jar.close()
+    return stats
+
+
+def collect_stats(paths, workers=None, chunk_size=256):
+    """
+    Returns a PoolStats of every class in the JARs at `paths`. Batches of
+    `chunk_size` classes are counted across `workers` processes, each
+    sending back only its own small PoolStats to be merged.
+    """
+    stats = PoolStats()
+    tasks = _jar_tasks(paths, chunk_size, _serial(workers))
+    for partial in _imap(_stats_task, tasks, workers):
+        stats.update(partial)
+    return stats
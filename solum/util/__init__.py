@@ -1,5 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 from .streamhelper import StreamReader
+from .bufferhelper import slice_bytes, map_file
+from .zipstream import (
+    ZipStreamWriter,
+    ZipStreamReader,
+    read_raw,
+    compress,
+    compress_chunks
+)
 
-__all__ = ['StreamReader']
+__all__ = [
+    'StreamReader',
+    'slice_bytes',
+    'map_file',
+    'ZipStreamWriter',
+    'ZipStreamReader',
+    'read_raw',
+    'compress',
+    'compress_chunks'
+]
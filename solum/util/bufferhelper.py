@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = ['slice_bytes', 'map_file']
+
+import mmap
+
+
+def slice_bytes(buf, start, end):
+    """
+    Returns the bytes in `buf` between `start` and `end` as bytes,
+    whatever kind of buffer `buf` is.
+    """
+    if isinstance(buf, memoryview):
+        return buf[start:end].tobytes()
+    return bytes(buf[start:end])
+
+
+def map_file(source):
+    """
+    Returns a read-only mmap of the open file `source`, or its contents
+    as bytes if it cannot be mapped (such as when it is empty).
+    """
+    try:
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError):
+        return source.read()
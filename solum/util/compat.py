@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+The differences between Python 2 and 3 that Solum cares about.
+
+Class files, JARs and manifests are always parsed from bytes. Strings
+from the constant pool are kept as raw modified UTF-8 until a constant is
+built; under Python 3 they are then decoded to str with `decode_utf8()`,
+while Python 2 keeps using the raw str as it always has.
+"""
+__all__ = [
+    'PY3',
+    'basestring',
+    'xrange',
+    'intern',
+    'BytesIO',
+    'iteritems',
+    'iterkeys',
+    'itervalues',
+    'decode_utf8',
+    'encode_utf8',
+    'to_text',
+    'to_bytes',
+    'replace_file'
+]
+
+import os
+import re
+import sys
+
+PY3 = sys.version_info[0] >= 3
+
+if PY3:
+    from io import BytesIO
+
+    basestring = str
+    xrange = range
+    intern = sys.intern
+
+    def iteritems(d):
+        return iter(d.items())
+
+    def iterkeys(d):
+        return iter(d.keys())
+
+    def itervalues(d):
+        return iter(d.values())
+
+    # Characters outside the BMP, which modified UTF-8 stores as a pair of
+    # three-byte surrogates rather than one four-byte sequence.
+    _SUPPLEMENTARY = re.compile(u'[\U00010000-\U0010ffff]')
+
+    def _surrogates(match):
+        code = ord(match.group()) - 0x10000
+        return chr(0xD800 | code >> 10) + chr(0xDC00 | code & 0x3FF)
+
+    def decode_utf8(data):
+        """Returns the modified UTF-8 `data` decoded to a str."""
+        try:
+            # Anything in modified UTF-8 that differs from UTF-8 proper is
+            # invalid UTF-8, so this never decodes wrongly.
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = data.replace(b'\xc0\x80', b'\x00').decode('utf-8',
+                'surrogatepass')
+            # Join surrogate pairs back into single characters.
+            return text.encode('utf-16-le', 'surrogatepass').decode(
+                'utf-16-le', 'surrogatepass')
+
+    def encode_utf8(text):
+        """Returns the str `text` encoded as modified UTF-8."""
+        if isinstance(text, bytes):
+            return text
+        try:
+            data = text.encode('ascii')
+        except UnicodeEncodeError:
+            text = _SUPPLEMENTARY.sub(_surrogates, text)
+            data = text.encode('utf-8', 'surrogatepass')
+        if b'\x00' in data:
+            data = data.replace(b'\x00', b'\xc0\x80')
+        return data
+
+    def to_text(data):
+        """Returns the bytes `data` as a str, if they aren't one already."""
+        if isinstance(data, bytes):
+            return data.decode('utf-8')
+        return data
+
+    def to_bytes(text):
+        """Returns the str `text` encoded as UTF-8, if it isn't bytes."""
+        if isinstance(text, str):
+            return text.encode('utf-8')
+        return text
+
+    def replace_file(src, dst):
+        """Renames `src` to `dst`, replacing `dst` if it exists."""
+        os.replace(src, dst)
+else:
+    try:
+        from cStringIO import StringIO as BytesIO
+    except ImportError:
+        from StringIO import StringIO as BytesIO
+
+    basestring = basestring
+    xrange = xrange
+    intern = intern
+
+    def iteritems(d):
+        return d.iteritems()
+
+    def iterkeys(d):
+        return d.iterkeys()
+
+    def itervalues(d):
+        return d.itervalues()
+
+    def decode_utf8(data):
+        return data
+
+    def encode_utf8(text):
+        """
+        Returns `text` as modified UTF-8. A str is assumed to be encoded
+        already, and only unicode is converted.
+        """
+        if not isinstance(text, unicode):
+            return text
+        try:
+            data = text.encode('ascii')
+        except UnicodeEncodeError:
+            units = []
+            for c in text:
+                code = ord(c)
+                if code > 0xFFFF:
+                    code -= 0x10000
+                    units.append(unichr(0xD800 | code >> 10))
+                    units.append(unichr(0xDC00 | code & 0x3FF))
+                else:
+                    units.append(c)
+            # Encoded a unit at a time, as Python 2 joins a surrogate pair
+            # into one four-byte sequence.
+            data = b''.join(u.encode('utf-8') for u in units)
+        if b'\x00' in data:
+            data = data.replace(b'\x00', b'\xc0\x80')
+        return data
+
+    def to_text(data):
+        return data
+
+    def to_bytes(text):
+        return text
+
+    def replace_file(src, dst):
+        try:
+            os.rename(src, dst)
+        except OSError:
+            # Windows won't rename over an existing file, and Python 2
+            # has no os.replace(), so this one isn't atomic there.
+            if not os.path.exists(dst):
+                raise
+            os.remove(dst)
+            os.rename(src, dst)
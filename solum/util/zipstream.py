@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+__all__ = [
+    'ZipStreamWriter',
+    'ZipStreamReader',
+    'read_raw',
+    'compress',
+    'compress_chunks'
+]
+
+import struct
+import zlib
+import zipfile
+
+from .compat import PY3
+
+_ZIP64_LIMIT = (1 << 31) - 1
+_FILECOUNT_LIMIT = (1 << 16) - 1
+
+_DATA_DESCRIPTOR = b'PK\x07\x08'
+# Signatures of the records that follow the last entry.
+_END_RECORDS = frozenset((
+    zipfile.stringCentralDir,
+    zipfile.stringEndArchive,
+    zipfile.stringEndArchive64
+))
+_ZIP64_EXTRA = 0x0001
+_READ_SIZE = 64 * 1024
+# The earliest time a zip entry can hold, given to entries written without
+# one so the output doesn't depend on when it was written.
+_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def read_raw(zf, zi):
+    """
+    Returns the still-compressed data for the entry `zi` in the open
+    ZipFile `zf`, without inflating it.
+    """
+    fp = zf.fp
+    fp.seek(zi.header_offset, 0)
+    header = struct.unpack(
+        zipfile.structFileHeader,
+        fp.read(zipfile.sizeFileHeader)
+    )
+    fp.seek(
+        header[zipfile._FH_FILENAME_LENGTH] +
+        header[zipfile._FH_EXTRA_FIELD_LENGTH],
+        1
+    )
+    return fp.read(zi.compress_size)
+
+
+def compress(data, compress_type=zipfile.ZIP_DEFLATED,
+        level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Returns a tuple of (CRC, compressed data) for `data`, ready to be
+    passed to `ZipStreamWriter.write_compressed()`. This is safe to call
+    from other threads, and zlib releases the GIL while it works.
+    """
+    crc = zlib.crc32(data) & 0xffffffff
+    if compress_type == zipfile.ZIP_DEFLATED:
+        co = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = co.compress(data) + co.flush()
+    return crc, data
+
+
+def compress_chunks(chunks, compress_type=zipfile.ZIP_DEFLATED,
+        level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Like `compress()`, but for data given as an iterable of strings, which
+    is never joined together. Returns a tuple of (CRC, uncompressed size,
+    compressed data).
+    """
+    crc = 0
+    size = 0
+    out = []
+    co = None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        co = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        out.append(co.compress(chunk) if co is not None else chunk)
+
+    if co is not None:
+        out.append(co.flush())
+    return crc & 0xffffffff, size, b''.join(out)
+
+
+def _dos_date_time(date_time):
+    dosdate = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dostime = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    return dosdate, dostime
+
+
+class ZipStreamWriter(object):
+    """
+    Writes a zip archive to any object with a `write()` method. Offsets
+    are tracked here rather than asked of the output, so it never needs
+    to be seekable, and entries whose compressed data is already known
+    can be copied in as-is.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        self._offset = 0
+        self._infos = []
+
+    def _write(self, data):
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def write_raw(self, zi, data):
+        """
+        Appends an entry described by the ZipInfo `zi`, whose CRC and
+        sizes must already be set, with the already-compressed `data`.
+        """
+        if (zi.file_size > _ZIP64_LIMIT or zi.compress_size > _ZIP64_LIMIT
+                or self._offset > _ZIP64_LIMIT):
+            raise zipfile.LargeZipFile('entry would require ZIP64')
+
+        zi_ = zipfile.ZipInfo(zi.filename, zi.date_time)
+        zi_.compress_type = zi.compress_type
+        zi_.comment = zi.comment
+        zi_.create_system = zi.create_system
+        zi_.internal_attr = zi.internal_attr
+        zi_.external_attr = zi.external_attr
+        # Sizes always go in the local header, so the data descriptor
+        # flag of the source entry (if any) no longer applies.
+        zi_.flag_bits = zi.flag_bits & ~0x08
+        zi_.CRC = zi.CRC
+        zi_.compress_size = zi.compress_size
+        zi_.file_size = zi.file_size
+        zi_.header_offset = self._offset
+
+        self._write(zi_.FileHeader())
+        self._write(data)
+        self._infos.append(zi_)
+
+    def writestr(self, filename, data, compress_type=zipfile.ZIP_DEFLATED,
+            date_time=None, level=zlib.Z_DEFAULT_COMPRESSION):
+        """
+        Compresses and appends `data` as the entry `filename`, stamped
+        with `date_time` or 1980-01-01 00:00:00.
+        """
+        crc, compressed = compress(data, compress_type, level)
+        self.write_compressed(filename, crc, len(data), compressed,
+            compress_type, date_time)
+
+    def write_compressed(self, filename, crc, file_size, data,
+            compress_type=zipfile.ZIP_DEFLATED, date_time=None):
+        """
+        Appends the entry `filename`, whose contents were `file_size` bytes
+        long with the given `crc` before being compressed into `data`.
+        See `compress()`. The entry is stamped with `date_time` or
+        1980-01-01 00:00:00; pass `time.localtime()[:6]` for the current
+        time.
+        """
+        zi = zipfile.ZipInfo(filename, date_time or _EPOCH)
+        zi.compress_type = compress_type
+        zi.external_attr = 0o600 << 16
+        zi.CRC = crc
+        zi.file_size = file_size
+        zi.compress_size = len(data)
+        self.write_raw(zi, data)
+
+    def close(self):
+        """
+        Writes the central directory and end record. The output is not
+        closed.
+        """
+        start = self._offset
+        for zi in self._infos:
+            filename, flag_bits = zi._encodeFilenameFlags()
+            dosdate, dostime = _dos_date_time(zi.date_time)
+            self._write(struct.pack(
+                zipfile.structCentralDir,
+                zipfile.stringCentralDir,
+                zi.create_version,
+                zi.create_system,
+                zi.extract_version,
+                zi.reserved,
+                flag_bits,
+                zi.compress_type,
+                dostime,
+                dosdate,
+                zi.CRC,
+                zi.compress_size,
+                zi.file_size,
+                len(filename),
+                0,
+                len(zi.comment),
+                0,
+                zi.internal_attr,
+                zi.external_attr,
+                zi.header_offset
+            ))
+            self._write(filename)
+            self._write(zi.comment)
+
+        count = len(self._infos)
+        size = self._offset - start
+        if count > _FILECOUNT_LIMIT or start > _ZIP64_LIMIT:
+            # Too many entries for the classic end record.
+            position = self._offset
+            self._write(struct.pack(
+                zipfile.structEndArchive64,
+                zipfile.stringEndArchive64,
+                44, 45, 45, 0, 0,
+                count, count, size, start
+            ))
+            self._write(struct.pack(
+                zipfile.structEndArchive64Locator,
+                zipfile.stringEndArchive64Locator,
+                0, position, 1
+            ))
+            count = min(count, _FILECOUNT_LIMIT)
+            start = min(start, 0xffffffff)
+
+        self._write(struct.pack(
+            zipfile.structEndArchive,
+            zipfile.stringEndArchive,
+            0, 0, count, count, size, start, 0
+        ))
+
+
+def _date_time(dosdate, dostime):
+    return (
+        (dosdate >> 9) + 1980,
+        dosdate >> 5 & 0xF,
+        dosdate & 0x1F,
+        dostime >> 11,
+        dostime >> 5 & 0x3F,
+        (dostime & 0x1F) * 2
+    )
+
+
+class ZipStreamReader(object):
+    """
+    Reads a zip archive front to back from any object with a `read()`
+    method, by walking the local file headers and never the central
+    directory, so the input doesn't need to be seekable. Iterating yields
+    a ZipInfo and the inflated contents of each entry in turn, so only
+    one entry is held in memory at a time.
+
+    Entries whose sizes follow them in a data descriptor are supported
+    if they are deflated. Like java.util.zip.ZipInputStream, stored
+    entries with a data descriptor are rejected, as there is no telling
+    where they end.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        # Read from `fp` but not yet used.
+        self._buffer = b''
+
+    def _read_some(self, size=_READ_SIZE):
+        if self._buffer:
+            data, self._buffer = self._buffer, b''
+            return data
+        return self._fp.read(size)
+
+    def _read(self, size, eof_ok=False):
+        """
+        Returns exactly `size` bytes, or raises BadZipfile if the input
+        ends first. If `eof_ok` is `True` nothing is returned
+        instead when the input ends before any of them.
+        """
+        parts = []
+        need = size
+        while need > 0:
+            chunk = self._read_some(max(need, _READ_SIZE))
+            if not chunk:
+                if eof_ok and need == size:
+                    return b''
+                raise zipfile.BadZipfile('truncated zip stream')
+            if len(chunk) > need:
+                self._buffer = chunk[need:]
+                chunk = chunk[:need]
+            parts.append(chunk)
+            need -= len(chunk)
+        return b''.join(parts)
+
+    def _inflate(self):
+        """
+        Inflates an entry of unknown size, leaving the input positioned
+        just after it. Returns a tuple of (contents, compressed size).
+        """
+        d = zlib.decompressobj(-15)
+        parts = []
+        consumed = 0
+        while True:
+            chunk = self._read_some()
+            if not chunk:
+                raise zipfile.BadZipfile('truncated zip stream')
+            consumed += len(chunk)
+            parts.append(d.decompress(chunk))
+            if d.unused_data or getattr(d, 'eof', False):
+                self._buffer = d.unused_data
+                consumed -= len(d.unused_data)
+                break
+        parts.append(d.flush())
+        return b''.join(parts), consumed
+
+    def __iter__(self):
+        while True:
+            signature = self._read(4, eof_ok=True)
+            if not signature or signature in _END_RECORDS:
+                return
+            elif signature != zipfile.stringFileHeader:
+                raise zipfile.BadZipfile('bad local file header')
+
+            header = struct.unpack(zipfile.structFileHeader,
+                signature + self._read(zipfile.sizeFileHeader - 4))
+            filename = self._read(header[zipfile._FH_FILENAME_LENGTH])
+            extra = self._read(header[zipfile._FH_EXTRA_FIELD_LENGTH])
+            flags = header[zipfile._FH_GENERAL_PURPOSE_FLAG_BITS]
+
+            if flags & 0x800:
+                filename = filename.decode('utf-8')
+            elif PY3:
+                # As zipfile does for names not flagged as UTF-8.
+                filename = filename.decode('cp437')
+            if flags & 0x01:
+                raise zipfile.BadZipfile('%s is encrypted' % filename)
+
+            zi = zipfile.ZipInfo(filename, _date_time(
+                header[zipfile._FH_LAST_MOD_DATE],
+                header[zipfile._FH_LAST_MOD_TIME]))
+            zi.flag_bits = flags
+            zi.compress_type = header[zipfile._FH_COMPRESSION_METHOD]
+            zi.extra = extra
+            zi.CRC = header[zipfile._FH_CRC]
+            zi.compress_size = header[zipfile._FH_COMPRESSED_SIZE]
+            zi.file_size = header[zipfile._FH_UNCOMPRESSED_SIZE]
+            zip64 = self._read_zip64_extra(zi)
+
+            if zi.compress_type not in (zipfile.ZIP_STORED,
+                    zipfile.ZIP_DEFLATED):
+                raise zipfile.BadZipfile('%s uses unsupported compression '
+                    'method %d' % (filename, zi.compress_type))
+
+            if flags & 0x08:
+                if zi.compress_type != zipfile.ZIP_DEFLATED:
+                    raise zipfile.BadZipfile('%s is stored with a data '
+                        'descriptor' % filename)
+                data, _ = self._inflate()
+                self._read_data_descriptor(zi, zip64)
+            else:
+                data = self._read(zi.compress_size)
+                if zi.compress_type == zipfile.ZIP_DEFLATED:
+                    data = zlib.decompress(data, -15)
+
+            if zlib.crc32(data) & 0xffffffff != zi.CRC:
+                raise zipfile.BadZipfile('bad CRC for %s' % filename)
+
+            yield zi, data
+
+    def _read_zip64_extra(self, zi):
+        """
+        Fills in the sizes of `zi` from its ZIP64 extra field, returning
+        `True` if it had one.
+        """
+        extra = zi.extra
+        while len(extra) >= 4:
+            tag, length = struct.unpack('<HH', extra[:4])
+            if tag == _ZIP64_EXTRA:
+                values = list(struct.unpack('<%dQ' % (length // 8),
+                    extra[4:4 + length // 8 * 8]))
+                if zi.file_size == 0xffffffff and values:
+                    zi.file_size = values.pop(0)
+                if zi.compress_size == 0xffffffff and values:
+                    zi.compress_size = values.pop(0)
+                return True
+            extra = extra[4 + length:]
+        return False
+
+    def _read_data_descriptor(self, zi, zip64):
+        data = self._read(4)
+        if data == _DATA_DESCRIPTOR:
+            # The signature is optional.
+            data = self._read(4)
+        zi.CRC, = struct.unpack('<I', data)
+        if zip64:
+            zi.compress_size, zi.file_size = struct.unpack('<QQ',
+                self._read(16))
+        else:
+            zi.compress_size, zi.file_size = struct.unpack('<II',
+                self._read(8))